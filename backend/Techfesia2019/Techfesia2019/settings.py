@@ -230,3 +230,46 @@ FIREBASE_CREDENTIALS_PATH = external_settings.FIREBASE_CREDENTIALS_PATH
 # initialize firebase
 FIREBASE_CREDENTIALS = firebase_admin.credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
 default_app = firebase_admin.initialize_app(FIREBASE_CREDENTIALS)
+FIREBASE_PROJECT_ID = FIREBASE_CREDENTIALS.project_id
+
+# public certificates of the keys signing firebase ID tokens, see registration.firebase_tokens.
+# They are cached for the max-age sent by Google, or FIREBASE_KEYS_DEFAULT_MAX_AGE seconds,
+# and refreshed in the background FIREBASE_KEYS_REFRESH_MARGIN seconds before they expire
+FIREBASE_PUBLIC_KEYS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+FIREBASE_KEYS_DEFAULT_MAX_AGE = 60 * 60
+FIREBASE_KEYS_REFRESH_MARGIN = 60
+
+# cache
+# Use a cache shared by all the worker processes in production (e.g. memcached or redis),
+# otherwise catalog invalidations done by one process are not seen by the others
+CACHES = getattr(external_settings, 'CACHES', {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+
+# seconds for which a rendered catalog response is cached. Responses are also invalidated on any catalog change
+EVENTS_CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# seconds for which the seat stats of events are cached. Stats are also invalidated on any registration change
+EVENTS_STATS_CACHE_TIMEOUT = 5
+
+# events list pagination
+EVENTS_PAGE_SIZE = 20
+EVENTS_MAX_PAGE_SIZE = 100
+
+# check-in at the venue gates: buffered attendance rows are written every CHECKIN_FLUSH_SIZE scans
+# or after CHECKIN_FLUSH_INTERVAL seconds, whichever comes first
+CHECKIN_FLUSH_SIZE = 100
+CHECKIN_FLUSH_INTERVAL = 2
+# events whose registrations are kept in memory by each process for check-in, least recently scanned ones are dropped
+CHECKIN_MAX_EVENTS = 50
+
+# firebase users are read through this backend, registration.utils.FakeFirebaseBackend keeps them in memory
+FIREBASE_BACKEND = 'registration.utils.FirebaseAdminBackend'
+
+# firebase users read at login are cached for FIREBASE_USER_CACHE_TIMEOUT seconds,
+# unknown uids for FIREBASE_UNKNOWN_USER_CACHE_TIMEOUT seconds
+FIREBASE_USER_CACHE_SIZE = 10000
+FIREBASE_USER_CACHE_TIMEOUT = 5 * 60
+FIREBASE_UNKNOWN_USER_CACHE_TIMEOUT = 30
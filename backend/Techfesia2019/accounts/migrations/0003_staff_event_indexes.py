@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_profile_user'),
+    ]
+
+    operations = [
+        # the auto created through tables are only indexed (profile..._id, event_id) first,
+        # checking whether any of a set of profiles organizes or volunteers for one event needs the reverse order
+        migrations.RunSQL(
+            'CREATE INDEX organizer_event_lookup_idx ON accounts_profileorganizer_events (event_id, profileorganizer_id)',
+            'DROP INDEX organizer_event_lookup_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX volunteer_event_lookup_idx ON accounts_profilevolunteer_events (event_id, profilevolunteer_id)',
+            'DROP INDEX volunteer_event_lookup_idx',
+        ),
+    ]
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from base.utils import allocate_public_ids, bulk_create_with_public_ids, save_with_public_id
+from event_registrations.models import Team, team_resolver
+from event_registrations.tests.factories import create_profile
+from events.models import SoloEvent, TeamEvent, event_resolver
+from events.tests.factories import create_solo_event
+
+
+class PublicIdTestCase(TestCase):
+    """
+        public_ids are generated without querying the database, taken ones are retried on insert
+    """
+
+    def setUp(self):
+        self.profile = create_profile('leader')
+
+    def test_save_does_not_look_up_public_id(self):
+        with CaptureQueriesContext(connection) as queries:
+            team = Team.objects.create(name='team', team_leader=self.profile)
+
+        self.assertEqual(len(team.public_id), settings.PUBLIC_ID_LENGTH)
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+
+    def test_taken_public_id_is_retried(self):
+        taken = Team.objects.create(name='team', team_leader=self.profile).public_id
+        with mock.patch('base.utils.generate_public_id', side_effect=[taken, 'free']):
+            team = Team.objects.create(name='other team', team_leader=self.profile)
+        self.assertEqual(team.public_id, 'free')
+
+        # other constraints are not retried
+        with self.assertRaises(IntegrityError):
+            Team.objects.create(name='team', team_leader=self.profile)
+
+    def test_other_constraints_naming_public_id_are_not_retried(self):
+        error = IntegrityError('UNIQUE constraint failed: attendance.event_id, attendance.registration_public_id')
+        save = mock.Mock(side_effect=error)
+        with self.assertRaises(IntegrityError):
+            save_with_public_id(Team(name='team', team_leader=self.profile), save)
+        self.assertEqual(save.call_count, 1)
+
+    def test_bulk_create_is_retried_with_new_public_ids(self):
+        taken = Team.objects.create(name='team', team_leader=self.profile).public_id
+        teams = [Team(name=f'team {i}', team_leader=self.profile) for i in range(3)]
+        with mock.patch('base.utils.allocate_public_ids', side_effect=[[taken, 'a', 'b'], ['c', 'd', 'e']]):
+            bulk_create_with_public_ids(Team, teams)
+
+        self.assertEqual(sorted(Team.objects.exclude(public_id=taken).values_list('public_id', flat=True)),
+                         ['c', 'd', 'e'])
+        self.assertEqual(len(set(allocate_public_ids(1000))), 1000)
+
+
+class PublicIdResolverTestCase(TestCase):
+    """
+        Every resolution is one indexed query, so deleted or converted objects are never served stale
+    """
+
+    def setUp(self):
+        self.event = create_solo_event()
+        self.team = Team.objects.create(name='team', team_leader=create_profile('leader'))
+
+    def test_existing_public_id_is_one_query(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                event = event_resolver.resolve(self.event.public_id)
+            self.assertIsInstance(event, SoloEvent)
+            self.assertEqual(event.pk, self.event.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(team_resolver.resolve(self.team.public_id), self.team)
+
+    def test_unknown_public_id_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(event_resolver.resolve('unknown'))
+        with self.assertNumQueries(1):
+            self.assertIsNone(team_resolver.resolve('unknown'))
+
+    def test_changes_are_seen_at_once(self):
+        public_id = self.event.public_id
+        event_resolver.resolve(public_id)
+        self.event.convert_to(TeamEvent, min_team_size=2, max_team_size=4)
+        converted = event_resolver.resolve(public_id)
+        self.assertIsInstance(converted, TeamEvent)
+
+        converted.delete()
+        self.assertIsNone(event_resolver.resolve(public_id))
@@ -1,20 +1,130 @@
-import random
+import secrets
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+
+PUBLIC_ID_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# INSERTs tried with new public_ids before giving up
+PUBLIC_ID_ATTEMPTS = 3
 
 
 def generate_random_string(length=10):
-    choices = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    return "".join(secrets.choice(PUBLIC_ID_CHARACTERS) for _ in range(length))
+
+
+def generate_public_id(length=None):
+    """
+        Returns a random public_id of settings.PUBLIC_ID_LENGTH characters, without checking the database.
+        With 62 ** 10 possible ids a collision is practically impossible, the unique index on public_id
+        catches the rare one: save objects with save_with_public_id and bulk_create_with_public_ids to retry it
+    """
+    return generate_random_string(length or settings.PUBLIC_ID_LENGTH)
+
+
+def allocate_public_ids(count, length=None):
+    """
+        Returns count distinct public_ids for new objects, for bulk_create. Costs no query
+    """
+    public_ids = set()
+    while len(public_ids) < count:
+        public_ids.add(generate_public_id(length))
+
+    return list(public_ids)
+
+
+def is_public_id_conflict(model, public_ids, using):
+    """
+        Tells whether an IntegrityError raised while inserting objects of model is caused by one of their
+        public_ids being taken. Error messages differ between database backends and may name other
+        constraints on public_id like columns, so the public_ids are looked up instead
+    """
+    # the parent table holds public_id with multi table inheritance
+    model = model._meta.get_field('public_id').model
+    return model._base_manager.using(using).filter(public_id__in=public_ids).exists()
+
+
+def save_with_public_id(instance, save, *args, **kwargs):
+    """
+        Calls save(*args, **kwargs), the save method of the parent class of instance, after giving instance
+        a public_id if it has none. The INSERT is retried with a new public_id if the generated one is taken
+    """
+    if instance.public_id:
+        return save(*args, **kwargs)
+
+    using = kwargs.get('using') or router.db_for_write(type(instance), instance=instance)
+    for attempt in range(PUBLIC_ID_ATTEMPTS):
+        instance.public_id = generate_public_id()
+        try:
+            if not transaction.get_connection(using).in_atomic_block:
+                return save(*args, **kwargs)
+            # a failed INSERT must not break the transaction around it
+            with transaction.atomic(using=using):
+                return save(*args, **kwargs)
+        except IntegrityError:
+            if attempt + 1 == PUBLIC_ID_ATTEMPTS or \
+                    not is_public_id_conflict(type(instance), [instance.public_id], using):
+                instance.public_id = ''
+                raise
+
+
+def bulk_create_with_public_ids(model, objs, batch_size=None):
+    """
+        bulk_create for objects with a public_id. Objects without one get one allocated, without any query.
+        If an allocated public_id is taken, the whole bulk_create is retried with new ones
+    """
+    missing = [obj for obj in objs if not obj.public_id]
+    using = router.db_for_write(model)
+    for attempt in range(PUBLIC_ID_ATTEMPTS):
+        public_ids = allocate_public_ids(len(missing))
+        for obj, public_id in zip(missing, public_ids):
+            obj.public_id = public_id
+        try:
+            with transaction.atomic(using=using):
+                return model.objects.bulk_create(objs, batch_size=batch_size)
+        except IntegrityError:
+            if not missing or attempt + 1 == PUBLIC_ID_ATTEMPTS or not is_public_id_conflict(model, public_ids, using):
+                raise
+
+
+class PublicIdResolver:
+    """
+        Finds the object having a given public_id with a single query.
 
-    selected_arr = [random.choice(choices) for _ in range(length)]
+        For multi table inheritance pass the parent model and its children as subtypes.
+        The concrete child is then found through the indexed public_id of the parent table
+        instead of trying every child table one after the other.
+    """
 
-    rand_string = "".join(selected_arr)
+    def __init__(self, model, subtypes=()):
+        self.model = model
+        self.subtypes = tuple(subtypes)
 
-    return rand_string
+    def resolve(self, public_id):
+        """
+            Returns the instance of the concrete model having public_id, None if it does not exist
+        """
+        if not self.subtypes:
+            return self.model.objects.filter(public_id=public_id).first()
 
+        relations = [subtype._meta.model_name for subtype in self.subtypes]
+        obj = self.model.objects.select_related(*relations).filter(public_id=public_id).first()
+        if obj is None:
+            return None
 
-def generate_public_id(object, length=10):
-    rand_string = generate_random_string(length)
+        return self.concrete(obj) or obj
 
-    while object.__class__.objects.filter(public_id=rand_string).exists():
-        rand_string = generate_random_string()
+    def concrete(self, obj):
+        """
+            Returns the instance of the subtype obj belongs to, None if obj is in none of them.
+            Select the subtypes along with obj to avoid a query per subtype
+        """
+        if isinstance(obj, self.subtypes):
+            return obj
 
-    return rand_string
+        for subtype in self.subtypes:
+            # missing children raise RelatedObjectDoesNotExist, which is also an AttributeError
+            child = getattr(obj, subtype._meta.model_name, None)
+            if child is not None:
+                return child
+        return None
@@ -0,0 +1,112 @@
+"""
+    Queued admission for hot events.
+
+    Registering for an event in queued admission mode only inserts an AdmissionTicket, so sign-up rushes do not
+    contend on the event row. The admission worker (manage.py process_admission_queue) drains the tickets in
+    arrival order and in batches, locking every event once per batch, and gives seats with the allocation engine.
+"""
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from event_registrations.models import AdmissionTicket, SoloEventRegistration, Team, TeamEventRegistration, \
+    TeamMember, staff_profile_ids
+from event_registrations.utils import team_size_error
+from events.allocation import admit_registrations, lock_event
+from events.models import TeamEvent, event_resolver
+
+ADMISSION_BATCH_SIZE = 200
+
+
+def admit_tickets(event, tickets):
+    """
+        Registers the profiles or teams of the pending tickets of one event and records the outcome on the tickets.
+        Tickets asking for a second registration of the same profile or team are rejected
+    """
+    is_team_event = isinstance(event, TeamEvent)
+    # registrations made meanwhile by requests for the event are seen once it is locked
+    lock_event(event)
+    if is_team_event:
+        team_ids = [t.team_id for t in tickets]
+        registered = set(TeamEventRegistration.objects.filter(event=event, team__in=team_ids)
+                         .values_list('team_id', flat=True))
+        # sizes of all teams of the batch in one query
+        teams = Team.objects.with_member_count().in_bulk(team_ids)
+        members = {team.pk: {team.team_leader_id} for team in teams.values()}
+        for team_id, profile_id in TeamMember.objects.filter(team__in=team_ids, invitation_accepted=True) \
+                .values_list('team_id', 'profile_id'):
+            members[team_id].add(profile_id)
+    else:
+        registered = set(SoloEventRegistration.objects
+                         .filter(event=event, profile__in=[t.profile_id for t in tickets])
+                         .values_list('profile_id', flat=True))
+    # organizers and volunteers of the event, read once for the whole batch
+    staff = staff_profile_ids(event.pk)
+
+    registrations = list()
+    for ticket in tickets:
+        registrant = ticket.team_id if is_team_event else ticket.profile_id
+        if is_team_event and ticket.team_id is None:
+            ticket.status, ticket.error = AdmissionTicket.REJECTED, 'A team is required to register for a team event'
+        elif not is_team_event and ticket.team_id is not None:
+            ticket.status, ticket.error = AdmissionTicket.REJECTED, 'Teams can not register for a solo event'
+        elif registrant in registered:
+            ticket.status, ticket.error = AdmissionTicket.REJECTED, 'Already registered for this event'
+        elif is_team_event and team_size_error(event, teams[ticket.team_id]):
+            ticket.status, ticket.error = AdmissionTicket.REJECTED, team_size_error(event, teams[ticket.team_id])
+        elif is_team_event and members[ticket.team_id] & staff:
+            ticket.status, ticket.error = AdmissionTicket.REJECTED, \
+                'Organizers and volunteers can not be members of participating teams'
+        elif not is_team_event and ticket.profile_id in staff:
+            ticket.status, ticket.error = AdmissionTicket.REJECTED, \
+                'Organizers and volunteers can not be participants of the event'
+        else:
+            registered.add(registrant)
+            if is_team_event:
+                registration = TeamEventRegistration(event_id=event.pk, team=teams[ticket.team_id])
+            else:
+                registration = SoloEventRegistration(event_id=event.pk, profile_id=ticket.profile_id)
+            registrations.append((ticket, registration))
+
+    promoted = admit_registrations(event, [registration for _, registration in registrations])
+    for ticket, registration in registrations:
+        ticket.status = AdmissionTicket.CONFIRMED if registration.pk in promoted else AdmissionTicket.WAITING
+        ticket.registration_public_id = registration.public_id
+
+    now = timezone.now()
+    for ticket in tickets:
+        ticket.processed_on = now
+    AdmissionTicket.objects.bulk_update(tickets, ['status', 'error', 'registration_public_id', 'processed_on'])
+
+
+@transaction.atomic
+def process_admission_queue(batch_size=ADMISSION_BATCH_SIZE):
+    """
+        Admits the oldest pending tickets, at most batch_size of them. Returns the number of tickets processed
+    """
+    pending = AdmissionTicket.objects.filter(status=AdmissionTicket.PENDING) \
+        .select_related('event__soloevent', 'event__teamevent').order_by('id')
+    if connection.features.has_select_for_update_skip_locked:
+        # concurrent workers take different tickets
+        pending = pending.select_for_update(skip_locked=True, of=('self',))
+    else:
+        # takes the write lock of SQLite, so that no other worker reads the same tickets
+        AdmissionTicket.objects.filter(pk=None).update(status=AdmissionTicket.PENDING)
+
+    tickets_of_events = OrderedDict()
+    tickets = list(pending[:batch_size])
+    for ticket in tickets:
+        tickets_of_events.setdefault(ticket.event_id, []).append(ticket)
+
+    for event_tickets in tickets_of_events.values():
+        event = event_resolver.concrete(event_tickets[0].event)
+        if event is None:
+            for ticket in event_tickets:
+                ticket.status, ticket.error = AdmissionTicket.REJECTED, 'This event does not take registrations'
+                ticket.processed_on = timezone.now()
+            AdmissionTicket.objects.bulk_update(event_tickets, ['status', 'error', 'processed_on'])
+        else:
+            admit_tickets(event, event_tickets)
+
+    return len(tickets)
@@ -0,0 +1,181 @@
+"""
+    Check-in of registrations at the venue gates.
+
+    Scans are answered from memory: for each event the public_ids of its confirmed registrations are loaded once
+    and reloaded only when the registrations version of the event changes (see events.utils). Events themselves
+    are resolved again when the catalog version changes, so a deleted event is not served from memory, and only
+    the settings.CHECKIN_MAX_EVENTS most recently scanned events are kept. Attendance rows
+    are buffered and written with one batched INSERT per flush, so a scan itself reads and writes nothing in
+    the database. Every process keeps its own registry; the unique constraint on Attendance keeps one row
+    per registration when the same QR code is scanned at gates served by different processes.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from base.decorators import run_in_background
+from events.models import event_resolver
+from events.utils import get_cache_version, get_catalog_version, registrations_version_key
+from .models import Attendance
+
+logger = logging.getLogger(__name__)
+
+CHECKED_IN = 'checked_in'
+ALREADY_CHECKED_IN = 'already_checked_in'
+NOT_REGISTERED = 'not_registered'
+
+
+class _EventEntry:
+
+    def __init__(self, event, catalog_version):
+        self.event = event
+        self.catalog_version = catalog_version
+        self.version = None
+        self.valid = frozenset()
+        self.checked_in = set()
+
+
+class CheckInRegistry:
+    """
+        In-memory sets of valid and checked in registrations per event, with a buffer of Attendance rows
+        flushed every settings.CHECKIN_FLUSH_SIZE scans or every settings.CHECKIN_FLUSH_INTERVAL seconds,
+        whichever comes first. A CHECKIN_FLUSH_INTERVAL of None disables the background flush.
+        Events are kept in least recently scanned order, at most settings.CHECKIN_MAX_EVENTS of them
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._buffer = list()
+        self._buffered_since = None
+        self._lock = threading.Lock()
+        self._flusher_started = False
+
+    def _entry(self, event_public_id):
+        catalog_version = get_catalog_version()
+        with self._lock:
+            entry = self._entries.get(event_public_id)
+            if entry is not None:
+                self._entries.move_to_end(event_public_id)
+
+        if entry is None or entry.catalog_version != catalog_version:
+            # the event may have been converted or deleted since it was resolved
+            event = event_resolver.resolve(event_public_id)
+            with self._lock:
+                if event is None:
+                    self._entries.pop(event_public_id, None)
+                    return None
+                entry = _EventEntry(event, catalog_version)
+                self._entries[event_public_id] = entry
+                while len(self._entries) > settings.CHECKIN_MAX_EVENTS:
+                    self._entries.popitem(last=False)
+
+        version = get_cache_version(registrations_version_key(entry.event.pk))
+        if entry.version != version:
+            self._load(entry, version)
+        return entry
+
+    def _load(self, entry, version):
+        event = entry.event
+        if hasattr(event, 'current_participants'):
+            valid = frozenset(event.current_participants().values_list('public_id', flat=True))
+        else:
+            # neither a solo nor a team event
+            valid = frozenset()
+        checked_in = set(Attendance.objects.filter(event_id=event.pk).values_list('registration_public_id', flat=True))
+
+        with self._lock:
+            checked_in.update(row.registration_public_id for row in self._buffer if row.event_id == event.pk)
+            entry.valid = valid
+            entry.checked_in = checked_in
+            entry.version = version
+
+    def check_in(self, event_public_id, registration_public_id, gate=''):
+        """
+            Checks in a registration of the event. Returns CHECKED_IN, ALREADY_CHECKED_IN or NOT_REGISTERED,
+            None if the event does not exist
+        """
+        entry = self._entry(event_public_id)
+        if entry is None:
+            return None
+        if registration_public_id not in entry.valid:
+            return NOT_REGISTERED
+
+        with self._lock:
+            if registration_public_id in entry.checked_in:
+                return ALREADY_CHECKED_IN
+            entry.checked_in.add(registration_public_id)
+            self._buffer.append(Attendance(event_id=entry.event.pk, registration_public_id=registration_public_id,
+                                           gate=gate, checked_in_at=timezone.now()))
+            if self._buffered_since is None:
+                self._buffered_since = time.monotonic()
+            full = len(self._buffer) >= settings.CHECKIN_FLUSH_SIZE
+
+        if full:
+            # the scan is answered from memory even if the rows can not be written now
+            self._flush_quietly()
+        else:
+            self._start_flusher()
+        return CHECKED_IN
+
+    def flush(self):
+        """
+            Writes the buffered Attendance rows with batched INSERTs. Returns the number of rows written
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, list()
+            self._buffered_since = None
+        if not rows:
+            return 0
+
+        try:
+            Attendance.objects.bulk_create(rows, batch_size=settings.CHECKIN_FLUSH_SIZE, ignore_conflicts=True)
+        except Exception:
+            # keep the rows for the next flush
+            with self._lock:
+                self._buffer[:0] = rows
+                self._buffered_since = self._buffered_since or time.monotonic()
+            raise
+        return len(rows)
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            # flush keeps the rows, the next one writes them
+            logger.exception("Could not write %d buffered check-ins", len(self._buffer))
+
+    def clear(self):
+        """
+            Forgets all events and drops the buffered rows without writing them
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+            self._buffer = list()
+            self._buffered_since = None
+
+    def _start_flusher(self):
+        if self._flusher_started or settings.CHECKIN_FLUSH_INTERVAL is None:
+            return
+        with self._lock:
+            if self._flusher_started:
+                return
+            self._flusher_started = True
+
+        run_in_background(self._flush_periodically)()
+        atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            interval = settings.CHECKIN_FLUSH_INTERVAL or 1
+            time.sleep(interval)
+            buffered_since = self._buffered_since
+            if buffered_since is not None and time.monotonic() - buffered_since >= interval:
+                self._flush_quietly()
+
+
+check_in_registry = CheckInRegistry()
@@ -0,0 +1,103 @@
+"""
+    Streaming export of the participant lists of events, as CSV or JSON lines.
+
+    Rows are produced while the response is sent: registrations are read with a chunked iterator joined to
+    their profiles and users, and the members of the teams of each chunk are read with one more query,
+    so memory stays flat however large the event is. Team registrations give one row per person,
+    the team leader first.
+"""
+import csv
+import json
+from itertools import islice
+
+from event_registrations.models import SoloEventRegistration, TeamEventRegistration, TeamMember
+from events.models import TeamEvent
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_COLUMNS = ('registration', 'status', 'team', 'role', 'username', 'name', 'email', 'phone_number',
+                  'college_name')
+
+
+def registration_status(registration):
+    if registration.is_complete:
+        return 'confirmed'
+    if registration.is_confirmed:
+        return 'waiting'
+    return 'pending'
+
+
+def person(profile):
+    user = profile.user
+    return dict(username=user.username, name=user.get_full_name(), email=user.email,
+                phone_number=profile.phone_number, college_name=profile.college_name)
+
+
+def in_chunks(iterable, size=EXPORT_CHUNK_SIZE):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def solo_rows(event):
+    registrations = SoloEventRegistration.objects.filter(event_id=event.pk) \
+        .select_related('profile__user').order_by('created_on', 'pk')
+    for registration in registrations.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield dict(registration=registration.public_id, status=registration_status(registration),
+                   team='', role='participant', **person(registration.profile))
+
+
+def team_rows(event):
+    registrations = TeamEventRegistration.objects.filter(event_id=event.pk) \
+        .select_related('team__team_leader__user').order_by('created_on', 'pk')
+    for chunk in in_chunks(registrations.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+        # prefetch_related is ignored by iterator(), members are fetched per chunk instead
+        members = dict()
+        for member in TeamMember.objects.filter(team__in=[registration.team_id for registration in chunk],
+                                                invitation_accepted=True) \
+                .select_related('profile__user').order_by('pk'):
+            members.setdefault(member.team_id, []).append(member.profile)
+
+        for registration in chunk:
+            team = registration.team
+            fields = dict(registration=registration.public_id, status=registration_status(registration),
+                          team=team.name)
+            yield dict(fields, role='leader', **person(team.team_leader))
+            for profile in members.get(team.pk, ()):
+                yield dict(fields, role='member', **person(profile))
+
+
+def participant_rows(event):
+    """
+        Yields the EXPORT_COLUMNS dicts of all registrations of a solo or team event, oldest registration first
+    """
+    if isinstance(event, TeamEvent):
+        return team_rows(event)
+    return solo_rows(event)
+
+
+class Echo:
+    """
+        File-like object returning what is written to it, for csv.writer to render single lines
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_rows(rows, file_format):
+    """
+        Yields the lines of rows in file_format, one of EXPORT_FORMATS
+    """
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            yield writer.writerow([row[column] for column in EXPORT_COLUMNS])
+    elif file_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(row) + '\n'
+    else:
+        raise ValueError(f"Unknown format {file_format}, should be one of {', '.join(EXPORT_FORMATS)}")
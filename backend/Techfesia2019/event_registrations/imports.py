@@ -0,0 +1,155 @@
+"""
+    Bulk import of on-spot registrations, from CSV files or JSON lists of rows.
+
+    Rows of solo events name a profile by its username or email, rows of team events name a team.
+    Rows may set is_reserved for the reserved slots. Profiles and teams are resolved in chunks,
+    registrations are inserted with chunked bulk_create and seats are given by one allocation,
+    so the number of queries grows with the number of chunks instead of the number of rows.
+    An import with an invalid row imports nothing.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+
+from accounts.models import Profile
+from event_registrations.models import SoloEventRegistration, Team, TeamEventRegistration, TeamMember, \
+    staff_profile_ids
+from event_registrations.utils import team_size_error
+from events.allocation import SEAT_COUNTERS, bulk_admit_registrations
+from events.models import Event, TeamEvent
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_FORMATS = ('csv', 'json')
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+
+def chunks(items, size=IMPORT_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_rows(content, file_format):
+    """
+        Returns the rows of a CSV file with a header line, or of a JSON list of objects, as dicts of strings.
+        Raises ValueError if the content can not be parsed or a JSON row has a list or object value
+    """
+    if file_format == 'csv':
+        return [{key.strip(): (value or '').strip() for key, value in row.items() if key}
+                for row in csv.DictReader(io.StringIO(content))]
+
+    if file_format == 'json':
+        try:
+            rows = json.loads(content)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Invalid JSON: {error}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON content must be a list of objects")
+        for number, row in enumerate(rows, 1):
+            for key, value in row.items():
+                if isinstance(value, (list, dict)):
+                    raise ValueError(f"Row {number}: {key} must be a string, a number or a boolean")
+                # the same values as in CSV rows
+                row[key] = '' if value is None else str(value).strip()
+        return rows
+
+    raise ValueError(f"Unknown format {file_format}, should be one of {', '.join(IMPORT_FORMATS)}")
+
+
+def is_true(value):
+    return value is True or str(value).strip().lower() in TRUE_VALUES
+
+
+def solo_registrations(event, rows, errors):
+    usernames = {row['username'] for row in rows if row.get('username')}
+    emails = {row['email'] for row in rows if row.get('email') and not row.get('username')}
+    profiles = dict()
+    for chunk in chunks(usernames):
+        profiles.update((('username', username), pk) for username, pk in
+                        Profile.objects.filter(user__username__in=chunk).values_list('user__username', 'pk'))
+    for chunk in chunks(emails):
+        profiles.update((('email', email), pk) for email, pk in
+                        Profile.objects.filter(user__email__in=chunk).values_list('user__email', 'pk'))
+
+    registered = set()
+    for chunk in chunks(set(profiles.values())):
+        registered.update(SoloEventRegistration.objects.filter(event=event, profile__in=chunk)
+                          .values_list('profile_id', flat=True))
+    staff = staff_profile_ids(event.pk)
+
+    registrations = list()
+    for number, row in enumerate(rows, 1):
+        key = ('username', row['username']) if row.get('username') else ('email', row.get('email'))
+        if not key[1]:
+            errors.append({'row': number, 'error': 'username or email is required'})
+        elif key not in profiles:
+            errors.append({'row': number, 'error': f'No profile with {key[0]} {key[1]}'})
+        elif profiles[key] in registered:
+            errors.append({'row': number, 'error': 'Already registered for this event'})
+        elif profiles[key] in staff:
+            errors.append({'row': number, 'error': 'Organizers and volunteers can not be participants of the event'})
+        else:
+            registered.add(profiles[key])
+            registrations.append(SoloEventRegistration(profile_id=profiles[key],
+                                                       is_reserved=is_true(row.get('is_reserved'))))
+    return registrations
+
+
+def team_registrations(event, rows, errors):
+    teams = dict()
+    for chunk in chunks({row['team'] for row in rows if row.get('team')}):
+        teams.update((team.name, team) for team in Team.objects.filter(name__in=chunk).with_member_count())
+
+    registered = set()
+    members = {team.pk: {team.team_leader_id} for team in teams.values()}
+    for chunk in chunks(members):
+        registered.update(TeamEventRegistration.objects.filter(event=event, team__in=chunk)
+                          .values_list('team_id', flat=True))
+        for team_id, profile_id in TeamMember.objects.filter(team__in=chunk, invitation_accepted=True) \
+                .values_list('team_id', 'profile_id'):
+            members[team_id].add(profile_id)
+    staff = staff_profile_ids(event.pk)
+
+    registrations = list()
+    for number, row in enumerate(rows, 1):
+        team = teams.get(row.get('team'))
+        if not row.get('team'):
+            errors.append({'row': number, 'error': 'team is required'})
+        elif team is None:
+            errors.append({'row': number, 'error': f'No team named {row["team"]}'})
+        elif team.pk in registered:
+            errors.append({'row': number, 'error': 'Already registered for this event'})
+        elif members[team.pk] & staff:
+            errors.append({'row': number,
+                           'error': 'Organizers and volunteers can not be members of participating teams'})
+        elif team_size_error(event, team):
+            errors.append({'row': number, 'error': team_size_error(event, team)})
+        else:
+            registered.add(team.pk)
+            registrations.append(TeamEventRegistration(team=team, is_reserved=is_true(row.get('is_reserved'))))
+    return registrations
+
+
+@transaction.atomic
+def import_registrations(event, rows):
+    """
+        Registers the rows for a SoloEvent or TeamEvent. Registrations join the waiting list and get the free seats
+        by the usual allocation rules. Returns the seat counters of the event after the import and the list of
+        {'row': number, 'error': message} of invalid rows, in which case nothing is imported
+    """
+    errors = list()
+    if isinstance(event, TeamEvent):
+        registrations = team_registrations(event, rows, errors)
+    else:
+        registrations = solo_registrations(event, rows, errors)
+    if errors:
+        return None, errors
+
+    if registrations:
+        bulk_admit_registrations(event, registrations)
+
+    summary = Event.objects.filter(pk=event.pk).values(*SEAT_COUNTERS).get()
+    summary['imported'] = len(registrations)
+    return summary, errors
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from event_registrations.imports import IMPORT_FORMATS, import_registrations, parse_rows
+from events.models import event_resolver
+
+
+class Command(BaseCommand):
+    help = "Imports on-spot registrations for an event from a CSV or JSON file. " \
+           "Rows name a profile by username or email for solo events, a team by name for team events, " \
+           "and may set is_reserved"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event', help="public_id of the event")
+        parser.add_argument('file')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="read from the file extension by default")
+
+    def handle(self, *args, **options):
+        event = event_resolver.resolve(options['event'])
+        if event is None:
+            raise CommandError(f"Event {options['event']} does not exist")
+
+        file_format = options['format'] or os.path.splitext(options['file'])[1].lstrip('.').lower()
+        try:
+            with open(options['file'], encoding='utf-8-sig') as file:
+                rows = parse_rows(file.read(), file_format)
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        start = time.perf_counter()
+        summary, errors = import_registrations(event, rows)
+        if errors:
+            for error in errors:
+                self.stderr.write(f"row {error['row']}: {error['error']}")
+            raise CommandError(f"Nothing was imported, {len(errors)} invalid rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['imported']} registrations in {time.perf_counter() - start:.2f} s, "
+            f"{summary['participants_count']} participants and {summary['waiting_participants_count']} waiting"
+        ))
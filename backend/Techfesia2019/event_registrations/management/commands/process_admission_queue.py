@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from event_registrations.admission import ADMISSION_BATCH_SIZE, process_admission_queue
+
+
+class Command(BaseCommand):
+    help = "Admits the queued registrations of events in queued admission mode, oldest first and in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ADMISSION_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="keep polling the queue instead of exiting when empty")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="seconds to wait before polling an empty queue again")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_admission_queue(options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write(f"Processed {processed} tickets")
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} tickets"))
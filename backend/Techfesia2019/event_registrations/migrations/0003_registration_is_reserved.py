@@ -0,0 +1,23 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_registrations', '0002_teameventregistration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soloeventregistration',
+            name='is_reserved',
+            field=models.BooleanField(default=False, help_text='Tells whether registration is for one of the reserved slots of the event'),
+        ),
+        migrations.AddField(
+            model_name='teameventregistration',
+            name='is_reserved',
+            field=models.BooleanField(default=False, help_text='Tells whether registration is for one of the reserved slots of the event'),
+        ),
+    ]
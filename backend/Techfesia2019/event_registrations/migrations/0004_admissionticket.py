@@ -0,0 +1,35 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_admission_mode'),
+        ('accounts', '0002_profile_user'),
+        ('event_registrations', '0003_registration_is_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.CharField(blank=True, db_index=True, max_length=100, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Waiting for the admission worker'), ('confirmed', 'Registered and got a seat'), ('waiting', 'Registered and on the waiting list'), ('rejected', 'Not registered')], default='pending', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('registration_public_id', models.CharField(blank=True, max_length=100)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('processed_on', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.Event')),
+                ('profile', models.ForeignKey(help_text='Profile that asked for the registration', on_delete=django.db.models.deletion.CASCADE, to='accounts.Profile')),
+                ('team', models.ForeignKey(blank=True, help_text='Team to register, only for team events', null=True, on_delete=django.db.models.deletion.CASCADE, to='event_registrations.Team')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='admissionticket',
+            index=models.Index(condition=models.Q(status='pending'), fields=['id'], name='admission_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_registrations', '0004_admissionticket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(fields=['team', 'event'], name='team_registration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teammember',
+            index=models.Index(fields=['profile', 'invitation_accepted'], name='teammember_profile_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_registrations', '0005_registration_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soloeventregistration',
+            index=models.Index(fields=['event', 'is_complete', 'is_reserved'], name='solo_reg_seat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='soloeventregistration',
+            index=models.Index(condition=models.Q(('is_complete', False), ('is_confirmed', True)), fields=['event', 'created_on'], name='solo_reg_waiting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='soloeventregistration',
+            index=models.Index(condition=models.Q(('is_complete', False), ('is_confirmed', True), ('is_reserved', True)), fields=['event', 'created_on'], name='solo_reg_waiting_reserved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(fields=['event', 'is_complete', 'is_reserved'], name='team_reg_seat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(condition=models.Q(('is_complete', False), ('is_confirmed', True)), fields=['event', 'created_on'], name='team_reg_waiting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teameventregistration',
+            index=models.Index(condition=models.Q(('is_complete', False), ('is_confirmed', True), ('is_reserved', True)), fields=['event', 'created_on'], name='team_reg_waiting_reserved_idx'),
+        ),
+    ]
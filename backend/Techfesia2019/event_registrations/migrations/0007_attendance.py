@@ -0,0 +1,29 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_admission_mode'),
+        ('event_registrations', '0006_registration_seat_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration_public_id', models.CharField(help_text='public_id of the solo or team registration that checked in', max_length=100)),
+                ('gate', models.CharField(blank=True, max_length=50)),
+                ('checked_in_at', models.DateTimeField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.Event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('event', 'registration_public_id'), name='unique_attendance'),
+        ),
+    ]
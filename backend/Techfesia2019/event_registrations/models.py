@@ -1,12 +1,62 @@
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import signals
+from django.dispatch import receiver
 
 # Create your models here.
-from accounts.models import Profile
-from base.utils import generate_public_id
+from accounts.models import Profile, ProfileOrganizer, ProfileVolunteer
+from base.utils import PublicIdResolver, save_with_public_id
 from django.utils.translation import gettext_lazy as _
 
+from events.allocation import cancel_registration, remember_seat_state, seat_state
 from events.models import Event
+from events.utils import bump_registrations_version
+
+
+def staff_conflict(event_id, profiles):
+    """
+        Tells whether any of profiles organizes ('organizer') or volunteers ('volunteer') for the event, else None.
+        profiles is a list or a queryset of profile ids. Answered by a single query of two indexed EXISTS subqueries
+    """
+    organizers = ProfileOrganizer.events.through.objects.filter(event_id=models.OuterRef('pk'),
+                                                                 profileorganizer__profile__in=profiles)
+    volunteers = ProfileVolunteer.events.through.objects.filter(event_id=models.OuterRef('pk'),
+                                                                 profilevolunteer__profile__in=profiles)
+    is_organizer, is_volunteer = Event.objects.filter(pk=event_id) \
+        .annotate(is_organizer=models.Exists(organizers), is_volunteer=models.Exists(volunteers)) \
+        .values_list('is_organizer', 'is_volunteer').get()
+
+    if is_organizer:
+        return 'organizer'
+    if is_volunteer:
+        return 'volunteer'
+    return None
+
+
+def staff_profile_ids(event_id):
+    """
+        Returns the set of ids of the profiles organizing or volunteering for the event, in one query
+    """
+    organizers = ProfileOrganizer.objects.filter(events=event_id).values_list('profile_id', flat=True)
+    volunteers = ProfileVolunteer.objects.filter(events=event_id).values_list('profile_id', flat=True)
+    return set(organizers.union(volunteers))
+
+
+class TeamQuerySet(models.QuerySet):
+
+    def of_profile(self, profile):
+        """
+            Teams led by profile or having it as a member who accepted the invitation
+        """
+        member_of = TeamMember.objects.filter(profile=profile, invitation_accepted=True).values('team_id')
+        return self.filter(models.Q(team_leader=profile) | models.Q(pk__in=member_of))
+
+    def with_member_count(self):
+        """
+            Annotates the number of members who accepted the invitation, read by Team.member_count
+        """
+        return self.annotate(accepted_member_count=models.Count('teammember',
+                                                                filter=models.Q(teammember__invitation_accepted=True)))
 
 
 class Team(models.Model):
@@ -26,15 +76,30 @@ class Team(models.Model):
 
     create_date = models.DateTimeField(auto_now_add=True)
 
+    objects = TeamQuerySet.as_manager()
+
     @property
     def member_count(self):
+        # teams fetched with Team.objects.with_member_count() do not need a query
+        if hasattr(self, 'accepted_member_count'):
+            return self.accepted_member_count
         return self.teammember_set.filter(invitation_accepted=True).count()
 
-    def save(self, *args, **kwargs):
-        if not self.public_id:
-            self.public_id = generate_public_id(self)
+    @property
+    def size(self):
+        # the team leader is not one of the members
+        return self.member_count + 1
+
+    def profile_ids(self):
+        """
+            Leader and accepted members of the team, as a subquery of profile ids
+        """
+        return Profile.objects.filter(models.Q(pk=self.team_leader_id) |
+                                      models.Q(teammember__team=self, teammember__invitation_accepted=True)) \
+            .values('pk')
 
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        save_with_public_id(self, super().save, *args, **kwargs)
 
 
 class TeamMember(models.Model):
@@ -48,6 +113,12 @@ class TeamMember(models.Model):
 
     joined_on = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # finds the teams of a profile
+            models.Index(fields=['profile', 'invitation_accepted'], name='teammember_profile_idx'),
+        ]
+
 
 class SoloEventRegistration(models.Model):
     public_id = models.CharField(max_length=100,
@@ -67,29 +138,51 @@ class SoloEventRegistration(models.Model):
                                        help_text="Tells whether registration is confirmed or is in waiting"
                                        )
 
+    is_reserved = models.BooleanField(default=False,
+                                      help_text="Tells whether registration is for one of the reserved slots of the event"
+                                      )
+
     created_on = models.DateTimeField(auto_now_add=True)
 
     updated_on = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # seats held for an event, see events.allocation.SEAT_COUNTERS
+            models.Index(fields=['event', 'is_complete', 'is_reserved'], name='solo_reg_seat_idx'),
+            # waiting lists of an event, oldest first
+            models.Index(fields=['event', 'created_on'], name='solo_reg_waiting_idx',
+                         condition=models.Q(is_complete=False, is_confirmed=True)),
+            models.Index(fields=['event', 'created_on'], name='solo_reg_waiting_reserved_idx',
+                         condition=models.Q(is_complete=False, is_confirmed=True, is_reserved=True)),
+        ]
+
     def clean(self):
         if self.is_complete is False and self.is_confirmed is True:
             raise ValidationError(_("Registration can not be confirmed until it is complete"))
 
-        if hasattr(self.profile, 'profileorganizer'):
-
-            if self.profile.profileorganizer in self.event.organizers.all():
-                raise ValidationError(_("Organizer can not be a participant for the same event"))
+        error = self.staff_conflict_error()
+        if error:
+            raise ValidationError(error)
 
-        if hasattr(self.profile, 'profilevolunteer'):
-
-            if self.profile.profilevolunteer in self.event.volunteers.all():
-                raise ValidationError(_("Volunteer can not be a participant for the same event"))
+    def staff_conflict_error(self):
+        """
+            Returns why the profile can not take part in the event, None if it does not organize or volunteer for it
+        """
+        return {
+            'organizer': _("Organizer can not be a participant for the same event"),
+            'volunteer': _("Volunteer can not be a participant for the same event"),
+        }.get(staff_conflict(self.event_id, [self.profile_id]))
 
     def save(self, *args, **kwargs):
-        if not self.public_id:
-            self.public_id = generate_public_id(self)
+        save_with_public_id(self, super().save, *args, **kwargs)
 
-        super().save(*args, **kwargs)
+    def cancel(self):
+        """
+            Withdraws the registration, its seat goes to the next registration on the waiting list.
+            Returns the id of that registration or None
+        """
+        return cancel_registration(self)
 
 
 class TeamEventRegistration(models.Model):
@@ -110,19 +203,173 @@ class TeamEventRegistration(models.Model):
                                        help_text="Tells whether registration is confirmed or is in waiting"
                                        )
 
+    is_reserved = models.BooleanField(default=False,
+                                      help_text="Tells whether registration is for one of the reserved slots of the event"
+                                      )
+
     created_on = models.DateTimeField(auto_now_add=True)
 
     updated_on = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # finds the registration of a team for an event
+            models.Index(fields=['team', 'event'], name='team_registration_idx'),
+            # seats held for an event, see events.allocation.SEAT_COUNTERS
+            models.Index(fields=['event', 'is_complete', 'is_reserved'], name='team_reg_seat_idx'),
+            # waiting lists of an event, oldest first
+            models.Index(fields=['event', 'created_on'], name='team_reg_waiting_idx',
+                         condition=models.Q(is_complete=False, is_confirmed=True)),
+            models.Index(fields=['event', 'created_on'], name='team_reg_waiting_reserved_idx',
+                         condition=models.Q(is_complete=False, is_confirmed=True, is_reserved=True)),
+        ]
+
     def clean(self):
         if self.is_complete is False and self.is_confirmed is True:
             raise ValidationError(_("Registration can not be confirmed until it is complete"))
 
-    # TODO: A check required that ensures no team member is an organizer/volunteer for same event
-    # Doing it here however might be too expensive
+        error = self.staff_conflict_error()
+        if error:
+            raise ValidationError(error)
+
+    def staff_conflict_error(self):
+        """
+            Returns why the team can not take part in the event, None if none of its leader and members
+            organizes or volunteers for it
+        """
+        return {
+            'organizer': _("Organizer of the event can not be a member of a participating team"),
+            'volunteer': _("Volunteer of the event can not be a member of a participating team"),
+        }.get(staff_conflict(self.event_id, self.team.profile_ids()))
+
+    def save(self, *args, **kwargs):
+        save_with_public_id(self, super().save, *args, **kwargs)
+
+    def cancel(self):
+        """
+            Withdraws the registration, its seat goes to the next registration on the waiting list.
+            Returns the id of that registration or None
+        """
+        return cancel_registration(self)
+
+
+class AdmissionTicket(models.Model):
+    """
+        A registration request for an event in queued admission mode, waiting for the admission worker
+    """
+    PENDING = 'pending'
+    CONFIRMED = 'confirmed'
+    WAITING = 'waiting'
+    REJECTED = 'rejected'
+    STATUSES = (
+        (PENDING, 'Waiting for the admission worker'),
+        (CONFIRMED, 'Registered and got a seat'),
+        (WAITING, 'Registered and on the waiting list'),
+        (REJECTED, 'Not registered'),
+    )
+
+    public_id = models.CharField(max_length=100,
+                                 unique=True,
+                                 blank=True,
+                                 db_index=True)
+
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE)
+
+    profile = models.ForeignKey(to=Profile, on_delete=models.CASCADE,
+                                help_text="Profile that asked for the registration"
+                                )
+
+    team = models.ForeignKey(to=Team, on_delete=models.CASCADE, null=True, blank=True,
+                             help_text="Team to register, only for team events"
+                             )
+
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+
+    error = models.CharField(max_length=200, blank=True)
+
+    registration_public_id = models.CharField(max_length=100, blank=True)
+
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    processed_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the admission worker reads the pending tickets in arrival order
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='admission_pending_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.public_id:
-            self.public_id = generate_public_id(self)
+        save_with_public_id(self, super().save, *args, **kwargs)
+
+
+class Attendance(models.Model):
+    """
+        Check-in of a solo or team registration at the venue, recorded when its QR code is scanned at a gate
+    """
+
+    event = models.ForeignKey(to=Event, on_delete=models.CASCADE)
+
+    registration_public_id = models.CharField(max_length=100,
+                                              help_text="public_id of the solo or team registration that checked in"
+                                              )
 
-        super().save(*args, **kwargs)
+    gate = models.CharField(max_length=50, blank=True)
+
+    checked_in_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # a registration checks in once, scans from several processes may race
+            models.UniqueConstraint(fields=['event', 'registration_public_id'], name='unique_attendance'),
+        ]
+
+
+# find teams and registrations by public_id
+team_resolver = PublicIdResolver(Team)
+solo_event_registration_resolver = PublicIdResolver(SoloEventRegistration)
+team_event_registration_resolver = PublicIdResolver(TeamEventRegistration)
+
+
+@receiver(signals.post_init, sender=SoloEventRegistration)
+@receiver(signals.post_init, sender=TeamEventRegistration)
+def load_seat_state(sender, instance, **kwargs):
+    remember_seat_state(instance)
+
+
+@receiver(signals.post_save, sender=SoloEventRegistration)
+@receiver(signals.post_save, sender=TeamEventRegistration)
+def update_seat_counters(sender, instance, created, **kwargs):
+    """
+        Moves the seat counters of the event by the change in state of the registration
+    """
+    old_state = None if created else instance._seat_state
+    if old_state == 'unknown':
+        Event.objects.filter(pk=instance.event_id).reconcile_seat_counters()
+    else:
+        new_state = seat_state(instance)
+        if old_state is None or old_state[0] == instance.event_id:
+            old = old_state[1] if old_state else dict()
+            Event.objects.filter(pk=instance.event_id) \
+                .adjust_seat_counters(**{counter: new_state[counter] - old.get(counter, 0) for counter in new_state})
+        else:
+            # the registration was moved to another event
+            Event.objects.filter(pk=old_state[0]) \
+                .adjust_seat_counters(**{counter: -value for counter, value in old_state[1].items()})
+            Event.objects.filter(pk=instance.event_id).adjust_seat_counters(**new_state)
+            bump_registrations_version(old_state[0])
+
+    bump_registrations_version(instance.event_id)
+    remember_seat_state(instance)
+
+
+@receiver(signals.post_delete, sender=SoloEventRegistration)
+@receiver(signals.post_delete, sender=TeamEventRegistration)
+def release_seat_counters(sender, instance, **kwargs):
+    old_state = instance._seat_state
+    if old_state == 'unknown':
+        Event.objects.filter(pk=instance.event_id).reconcile_seat_counters()
+    elif old_state is not None:
+        Event.objects.filter(pk=old_state[0]) \
+            .adjust_seat_counters(**{counter: -value for counter, value in old_state[1].items()})
+    bump_registrations_version(instance.event_id)
@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+from event_registrations.models import AdmissionTicket, Team
+
+
+class AdmissionTicketSerializer(serializers.ModelSerializer):
+    registration = serializers.CharField(source='registration_public_id')
+
+    class Meta:
+        model = AdmissionTicket
+        fields = ['public_id', 'status', 'registration', 'error', 'created_on', 'processed_on']
+
+
+class TeamSerializer(serializers.ModelSerializer):
+    """
+        Serializes teams fetched with Team.objects.with_member_count() and select_related('team_leader__user'),
+        so that a listing of teams costs a single query
+    """
+    team_leader = serializers.CharField(source='team_leader.user.username')
+    member_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Team
+        fields = ['public_id', 'name', 'team_leader', 'member_count', 'create_date']
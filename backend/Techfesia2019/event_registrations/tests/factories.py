@@ -0,0 +1,17 @@
+"""
+    Profiles registering for events, shared by the tests of all apps
+"""
+from accounts.models import Profile
+from registration.models import User
+
+
+def create_profile(username, **user_fields):
+    """
+        Creates a user named username and its profile
+    """
+    user = User.objects.create(username=username, **user_fields)
+    return Profile.objects.create(user=user, phone_number='+910000000000', college_name='college')
+
+
+def create_profiles(count):
+    return [create_profile(f'user {i}') for i in range(count)]
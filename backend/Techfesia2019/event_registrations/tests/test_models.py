@@ -0,0 +1,155 @@
+from unittest import skipUnless
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+
+from accounts.models import ProfileOrganizer, ProfileVolunteer
+from event_registrations.models import SoloEventRegistration, Team, TeamEventRegistration, TeamMember
+from event_registrations.tests.factories import create_profile, create_profiles
+from event_registrations.utils import registrations_of_profile
+from events.models import Event
+from events.tests.factories import create_solo_event, create_team_event
+
+
+class CancellationTestCase(TestCase):
+    """
+        Cancelling a registration gives its seat to exactly the next eligible waiting registration
+    """
+
+    def setUp(self):
+        self.event = create_solo_event(max_participants=2, reserved_slots=1)
+        self.profiles = create_profiles(5)
+
+    def register(self, profile, **fields):
+        return SoloEventRegistration.objects.create(event=self.event, profile=profile, is_confirmed=True, **fields)
+
+    def participants(self):
+        return set(self.event.current_participants().values_list('pk', flat=True))
+
+    def test_cancelling_a_seat_promotes_the_oldest_waiting_registration(self):
+        first, second, third, fourth = [self.register(profile, is_reserved=True) for profile in self.profiles[:4]]
+        self.event.refresh_participants()
+        self.assertEqual(self.participants(), {first.pk, second.pk})
+
+        self.assertEqual(first.cancel(), third.pk)
+        self.assertEqual(self.participants(), {second.pk, third.pk})
+        self.assertFalse(SoloEventRegistration.objects.filter(pk=first.pk).exists())
+        self.assertEqual(Event.objects.get(pk=self.event.pk).waiting_participants_count, 1)
+
+    def test_free_reserved_slot_goes_to_reserved_registration_first(self):
+        reserved = self.register(self.profiles[0], is_reserved=True)
+        general = self.register(self.profiles[1])
+        waiting_general = self.register(self.profiles[2])
+        waiting_reserved = self.register(self.profiles[3], is_reserved=True)
+        self.event.refresh_participants()
+        self.assertEqual(self.participants(), {reserved.pk, general.pk})
+
+        self.assertEqual(reserved.cancel(), waiting_reserved.pk)
+        self.assertEqual(self.participants(), {general.pk, waiting_reserved.pk})
+        self.assertEqual(self.event.refresh_participants(), [])
+
+    def test_cancelling_a_waiting_registration_promotes_nobody(self):
+        registrations = [self.register(profile) for profile in self.profiles[:3]]
+        # one seat is left for reserved registrations
+        self.event.refresh_participants()
+        self.assertEqual(self.participants(), {registrations[0].pk})
+
+        self.assertIsNone(registrations[2].cancel())
+        self.assertEqual(self.participants(), {registrations[0].pk})
+        self.assertEqual(Event.objects.get(pk=self.event.pk).waiting_participants_count, 1)
+
+
+class ProfileRegistrationsTestCase(TestCase):
+    """
+        All registrations of a profile are found with one query, through teams it leads or joined
+    """
+
+    def setUp(self):
+        self.solo_event = create_solo_event('solo event')
+        self.team_events = [create_team_event(f'team event {i}') for i in range(3)]
+        self.leader, self.member, self.invited = [create_profile(username)
+                                                  for username in ('leader', 'member', 'invited')]
+
+        self.team = Team.objects.create(name='team', team_leader=self.leader)
+        TeamMember.objects.create(team=self.team, profile=self.member, invitation_accepted=True)
+        TeamMember.objects.create(team=self.team, profile=self.invited, invitation_accepted=False)
+        other_team = Team.objects.create(name='other team', team_leader=self.invited)
+
+        SoloEventRegistration.objects.create(event=self.solo_event, profile=self.member)
+        TeamEventRegistration.objects.create(event=self.team_events[0], team=self.team)
+        TeamEventRegistration.objects.create(event=self.team_events[1], team=self.team)
+        TeamEventRegistration.objects.create(event=self.team_events[2], team=other_team)
+
+    def test_registrations_of_profile(self):
+        with self.assertNumQueries(1):
+            registrations = list(registrations_of_profile(self.member))
+
+        self.assertEqual(sorted((r['event_title'], r['team_public_id']) for r in registrations),
+                         [('solo event', None),
+                          ('team event 0', self.team.public_id),
+                          ('team event 1', self.team.public_id)])
+        self.assertEqual(len(registrations_of_profile(self.leader)), 2)
+        self.assertEqual([r['event_title'] for r in registrations_of_profile(self.invited)], ['team event 2'])
+
+    def test_find_registration(self):
+        self.assertEqual(self.team_events[0].find_registration(self.member.user).team, self.team)
+        self.assertEqual(self.team_events[1].find_registration(self.leader.user).team, self.team)
+        self.assertIsNone(self.team_events[0].find_registration(self.invited.user))
+
+
+class StaffConflictTestCase(TestCase):
+    """
+        Organizers and volunteers of an event can not take part in it, alone or in a team
+    """
+
+    def setUp(self):
+        self.event = create_team_event()
+        self.leader, self.member, self.volunteer = [create_profile(username)
+                                                    for username in ('leader', 'member', 'volunteer')]
+        self.team = Team.objects.create(name='team', team_leader=self.leader)
+        TeamMember.objects.create(team=self.team, profile=self.member, invitation_accepted=True)
+        ProfileVolunteer.objects.create(profile=self.volunteer).events.add(self.event)
+
+    def test_team_without_staff_members_can_register(self):
+        registration = TeamEventRegistration(event=self.event, team=self.team)
+        with self.assertNumQueries(1):
+            self.assertIsNone(registration.staff_conflict_error())
+
+    def test_team_with_a_volunteer_can_not_register(self):
+        TeamMember.objects.create(team=self.team, profile=self.volunteer, invitation_accepted=True)
+        registration = TeamEventRegistration(event=self.event, team=self.team)
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(registration.staff_conflict_error())
+        self.assertRaises(ValidationError, registration.clean)
+
+    def test_organizer_can_not_register(self):
+        ProfileOrganizer.objects.create(profile=self.member).events.add(self.event)
+        registration = SoloEventRegistration(event=self.event, profile=self.member)
+        self.assertEqual(registration.staff_conflict_error(), "Organizer can not be a participant for the same event")
+
+
+@skipUnless(connection.vendor == 'sqlite', "query plans are checked on SQLite")
+class RegistrationIndexTestCase(TestCase):
+    """
+        The seat and waiting list queries of the allocation engine must be answered from indexes
+    """
+
+    def setUp(self):
+        self.events = [create_solo_event('solo event'), create_team_event()]
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index}', plan)
+        # a temporary b-tree means the rows were sorted instead of read in index order
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_queries_use_indexes(self):
+        for event, prefix in zip(self.events, ('solo', 'team')):
+            with self.subTest(event=event.title):
+                self.assertUsesIndex(event.current_waiting_participants().order_by('created_on', 'pk'),
+                                     f'{prefix}_reg_waiting_idx')
+                self.assertUsesIndex(event.current_waiting_reserved_participants().order_by('created_on', 'pk'),
+                                     f'{prefix}_reg_waiting_reserved_idx')
+                self.assertUsesIndex(event.current_participants().values('pk'), f'{prefix}_reg_seat_idx')
+                self.assertUsesIndex(event.current_reserved_participants().values('pk'), f'{prefix}_reg_seat_idx')
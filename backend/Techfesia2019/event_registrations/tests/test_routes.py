@@ -0,0 +1,316 @@
+import json
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from accounts.models import ProfileOrganizer
+from event_registrations.admission import process_admission_queue
+from event_registrations.checkin import ALREADY_CHECKED_IN, CHECKED_IN, NOT_REGISTERED, check_in_registry
+from event_registrations.exports import EXPORT_COLUMNS
+from event_registrations.models import AdmissionTicket, Attendance, SoloEventRegistration, Team, \
+    TeamEventRegistration, TeamMember
+from event_registrations.tests.factories import create_profile, create_profiles
+from events.models import Event
+from events.tests.factories import create_solo_event, create_team_event
+from registration.models import User
+
+
+class AdmissionQueueTestCase(APITestCase):
+    """
+        Registrations for events in queued admission mode are accepted as tickets and admitted by the worker
+    """
+
+    def setUp(self):
+        self.event = create_solo_event(max_participants=2, admission_mode=Event.QUEUED_ADMISSION)
+        self.users = [profile.user for profile in create_profiles(3)]
+
+    def register(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('event_registration', args=[self.event.public_id]))
+
+    def poll(self, user, ticket):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse('admission_ticket', args=[ticket]))
+
+    def test_tickets_are_admitted_in_arrival_order(self):
+        tickets = list()
+        for user in self.users:
+            response = self.register(user)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['status'], AdmissionTicket.PENDING)
+            tickets.append(response.data['ticket'])
+        self.assertEqual(self.event.soloeventregistration_set.count(), 0)
+
+        self.assertEqual(process_admission_queue(), 3)
+        statuses = [self.poll(user, ticket).data['status'] for user, ticket in zip(self.users, tickets)]
+        self.assertEqual(statuses, [AdmissionTicket.CONFIRMED, AdmissionTicket.CONFIRMED, AdmissionTicket.WAITING])
+        self.assertEqual(process_admission_queue(), 0)
+
+    def test_second_registration_of_a_profile_is_rejected(self):
+        first = self.register(self.users[0]).data['ticket']
+        second = self.register(self.users[0]).data['ticket']
+        process_admission_queue()
+
+        self.assertEqual(self.poll(self.users[0], first).data['status'], AdmissionTicket.CONFIRMED)
+        self.assertEqual(self.poll(self.users[0], second).data['status'], AdmissionTicket.REJECTED)
+
+    def test_batch_reads_the_staff_once(self):
+        tickets = [self.register(user).data['ticket'] for user in self.users]
+        # became an organizer while the ticket was waiting
+        ProfileOrganizer.objects.create(profile=self.users[1].profile).events.add(self.event)
+
+        with CaptureQueriesContext(connection) as queries:
+            process_admission_queue()
+        statuses = [AdmissionTicket.objects.get(public_id=ticket).status for ticket in tickets]
+        self.assertEqual(statuses, [AdmissionTicket.CONFIRMED, AdmissionTicket.REJECTED, AdmissionTicket.CONFIRMED])
+        self.assertEqual(len([query for query in queries if 'accounts_profileorganizer' in query['sql']]), 1)
+
+    def test_tickets_are_private(self):
+        ticket = self.register(self.users[0]).data['ticket']
+        self.assertEqual(self.poll(self.users[1], ticket).status_code, 403)
+
+    def test_direct_admission_registers_right_away(self):
+        self.event.admission_mode = Event.DIRECT_ADMISSION
+        self.event.save()
+
+        response = self.register(self.users[0])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], AdmissionTicket.CONFIRMED)
+        self.assertEqual(self.register(self.users[0]).status_code, 422)
+
+
+class TeamListTestCase(APITestCase):
+    """
+        Listing teams reads the member counts from an annotation instead of a query per team
+    """
+
+    def setUp(self):
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.profiles = create_profiles(4)
+        self.team_count = 0
+
+    def create_teams(self, count):
+        for _ in range(count):
+            self.team_count += 1
+            team = Team.objects.create(name=f'team {self.team_count}', team_leader=self.profiles[0])
+            for profile in self.profiles[1:]:
+                TeamMember.objects.create(team=team, profile=profile, invitation_accepted=profile != self.profiles[3])
+
+    def list_teams(self):
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('team_list'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_listing_query_count_is_constant(self):
+        self.create_teams(2)
+        response, few_teams_queries = self.list_teams()
+        self.assertEqual([team['member_count'] for team in response.data['teams']], [2, 2])
+
+        self.create_teams(20)
+        response, many_teams_queries = self.list_teams()
+        self.assertEqual(len(response.data['teams']), 22)
+        self.assertEqual(few_teams_queries, many_teams_queries)
+
+    def test_team_size_is_validated_on_registration(self):
+        self.create_teams(1)
+        event = create_team_event(min_team_size=4, max_team_size=5, admission_mode=Event.QUEUED_ADMISSION)
+        team = Team.objects.get()
+
+        self.client.force_authenticate(self.profiles[0].user)
+        response = self.client.post(reverse('event_registration', args=[event.public_id]), {'team': team.public_id})
+        self.assertEqual(response.status_code, 422)
+
+        # members may leave the team while its ticket is queued
+        ticket = AdmissionTicket.objects.create(event=event, profile=self.profiles[0], team=team)
+        process_admission_queue()
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, AdmissionTicket.REJECTED)
+        self.assertIn('at least 4', ticket.error)
+
+
+class RegistrationImportTestCase(APITestCase):
+    """
+        Organizers import on-spot registrations in bulk, all rows or none
+    """
+
+    def setUp(self):
+        self.event = create_solo_event(max_participants=30)
+        for i in range(40):
+            create_profile(f'user{i}', email=f'user{i}@example.com')
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+
+    def import_rows(self, content, content_type):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.generic('POST', reverse('registration_import', args=[self.event.public_id]),
+                                           content, content_type=content_type)
+        return response, len(queries)
+
+    def test_csv_import(self):
+        rows = '\n'.join(f'user{i},' if i % 2 else f',user{i}@example.com' for i in range(40))
+        response, queries = self.import_rows(f'username,email\n{rows}', 'text/csv')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['imported'], 40)
+        self.assertEqual(response.data['participants_count'], 30)
+        self.assertEqual(response.data['waiting_participants_count'], 10)
+        self.assertLess(queries, 25)
+
+    def test_invalid_rows_import_nothing(self):
+        rows = '[{"username": "user1"}, {"username": "nobody"}, {"email": "user1@example.com"}]'
+        response, _ = self.import_rows(rows, 'application/json')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual([row['row'] for row in response.data['rows']], [2, 3])
+        self.assertEqual(self.event.soloeventregistration_set.count(), 0)
+
+    def test_malformed_json_rows_are_rejected(self):
+        for rows in ('[{"username": ["user1"]}]', '[{"username": "user1"}, {"team": {"name": "team"}}]'):
+            response, _ = self.import_rows(rows, 'application/json')
+            self.assertEqual(response.status_code, 400, rows)
+        self.assertIn('Row 2', response.data['error'])
+
+        response, _ = self.import_rows('[{"username": "user1", "is_reserved": true}, {"email": null, "username": 2}]',
+                                       'application/json')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['rows'], [{'row': 2, 'error': 'No profile with username 2'}])
+        self.assertEqual(self.event.soloeventregistration_set.count(), 0)
+
+
+@override_settings(CHECKIN_FLUSH_SIZE=3, CHECKIN_FLUSH_INTERVAL=None)
+class CheckInTestCase(APITestCase):
+    """
+        Gate scans are answered from memory and their attendance rows are written in batches
+    """
+
+    def setUp(self):
+        check_in_registry.clear()
+        self.event = create_solo_event(max_participants=4)
+        self.registrations = [SoloEventRegistration.objects.create(event=self.event, profile=profile, is_confirmed=True)
+                              for profile in create_profiles(5)]
+        self.event.refresh_participants()
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+
+    def scan(self, registration):
+        return self.client.post(reverse('check_in', args=[self.event.public_id]),
+                                {'registration': registration.public_id, 'gate': 'north'})
+
+    def test_scans_are_written_in_batches(self):
+        self.assertEqual(self.scan(self.registrations[0]).data['status'], CHECKED_IN)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scan(self.registrations[1]).data['status'], CHECKED_IN)
+            self.assertEqual(self.scan(self.registrations[0]).data['status'], ALREADY_CHECKED_IN)
+        self.assertEqual(Attendance.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            self.scan(self.registrations[2])
+        self.assertEqual(set(Attendance.objects.values_list('registration_public_id', flat=True)),
+                         {registration.public_id for registration in self.registrations[:3]})
+
+        self.scan(self.registrations[3])
+        check_in_registry.clear()
+        # a new registry reads the attendance of earlier flushes back
+        self.assertEqual(self.scan(self.registrations[1]).data['status'], ALREADY_CHECKED_IN)
+
+    def test_waiting_registration_is_refused_until_it_gets_a_seat(self):
+        waiting = self.registrations[4]
+        response = self.scan(waiting)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['status'], NOT_REGISTERED)
+
+        self.registrations[0].cancel()
+        self.assertEqual(self.scan(waiting).data['status'], CHECKED_IN)
+        self.assertEqual(self.scan(self.registrations[0]).status_code, 422)
+        self.assertEqual(check_in_registry.flush(), 1)
+
+    def test_scans_are_answered_when_the_rows_can_not_be_written(self):
+        self.scan(self.registrations[0])
+        self.scan(self.registrations[1])
+        with mock.patch.object(Attendance.objects, 'bulk_create', side_effect=DatabaseError('database is locked')):
+            with self.assertLogs('event_registrations.checkin', 'ERROR'):
+                self.assertEqual(self.scan(self.registrations[2]).data['status'], CHECKED_IN)
+        self.assertEqual(self.scan(self.registrations[2]).data['status'], ALREADY_CHECKED_IN)
+        self.assertEqual(Attendance.objects.count(), 0)
+
+        # the rows are kept for the next flush
+        self.assertEqual(check_in_registry.flush(), 3)
+        self.assertEqual(Attendance.objects.count(), 3)
+
+    def test_deleted_event_is_forgotten(self):
+        event = create_solo_event('other event')
+        url = reverse('check_in', args=[event.public_id])
+        self.assertEqual(self.client.post(url, {'registration': 'unknown'}).data['status'], NOT_REGISTERED)
+
+        event.delete()
+        response = self.client.post(url, {'registration': 'unknown'})
+        self.assertEqual(response.data, {'error': 'This event does not exist'})
+
+    @override_settings(CHECKIN_MAX_EVENTS=1)
+    def test_least_recently_scanned_events_are_dropped(self):
+        event = create_solo_event('other event')
+        self.scan(self.registrations[0])
+        self.client.post(reverse('check_in', args=[event.public_id]), {'registration': 'unknown'})
+        self.assertEqual(list(check_in_registry._entries), [event.public_id])
+
+        # the dropped event is loaded again, its check-ins included
+        self.assertEqual(self.scan(self.registrations[0]).data['status'], ALREADY_CHECKED_IN)
+        self.assertEqual(list(check_in_registry._entries), [self.event.public_id])
+
+
+class ParticipantExportTestCase(APITestCase):
+    """
+        Participant lists are streamed with a number of queries independent of the number of registrations
+    """
+
+    def setUp(self):
+        self.solo_event = create_solo_event('solo event', max_participants=1)
+        self.team_event = create_team_event()
+        self.profiles = [create_profile(f'user{i}', first_name=f'User {i}') for i in range(4)]
+        for profile in self.profiles[:2]:
+            SoloEventRegistration.objects.create(event=self.solo_event, profile=profile, is_confirmed=True)
+        self.solo_event.refresh_participants()
+
+        for leader, member in zip(self.profiles[:2], self.profiles[2:]):
+            team = Team.objects.create(name=f'team {leader.user.username}', team_leader=leader)
+            TeamMember.objects.create(team=team, profile=member, invitation_accepted=True)
+            TeamEventRegistration.objects.create(event=self.team_event, team=team)
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+
+    def export(self, event, output):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('participant_export', args=[event.public_id]), {'output': output})
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response.streaming_content).decode()
+        return content, len(queries)
+
+    def test_csv_export(self):
+        content, _ = self.export(self.solo_event, 'csv')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], ','.join(EXPORT_COLUMNS))
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['confirmed', 'waiting'])
+        self.assertIn('User 0', lines[1])
+
+    def test_jsonl_export_of_teams(self):
+        content, queries = self.export(self.team_event, 'jsonl')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['team'], row['role'], row['username']) for row in rows],
+                         [('team user0', 'leader', 'user0'), ('team user0', 'member', 'user2'),
+                          ('team user1', 'leader', 'user1'), ('team user1', 'member', 'user3')])
+
+        team = Team.objects.create(name='team user2', team_leader=self.profiles[2])
+        TeamEventRegistration.objects.create(event=self.team_event, team=team)
+        self.assertEqual(self.export(self.team_event, 'jsonl')[1], queries)
+
+    def test_export_is_for_staff_and_organizers(self):
+        self.client.force_authenticate(self.profiles[0].user)
+        url = reverse('participant_export', args=[self.solo_event.public_id])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        ProfileOrganizer.objects.create(profile=self.profiles[0]).events.add(self.solo_event)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, {'output': 'xml'}).status_code, 400)
@@ -0,0 +1,13 @@
+from django.urls import path
+from .views import ProfileRegistrationsView, TeamListView, EventRegistrationView, AdmissionTicketView, \
+    RegistrationImportView, CheckInView, ParticipantExportView
+
+urlpatterns = [
+    path('', ProfileRegistrationsView.as_view(), name='profile_registrations'),
+    path('/teams', TeamListView.as_view(), name='team_list'),
+    path('/events/<str:public_id>', EventRegistrationView.as_view(), name='event_registration'),
+    path('/events/<str:public_id>/import', RegistrationImportView.as_view(), name='registration_import'),
+    path('/events/<str:public_id>/checkin', CheckInView.as_view(), name='check_in'),
+    path('/events/<str:public_id>/export', ParticipantExportView.as_view(), name='participant_export'),
+    path('/tickets/<str:public_id>', AdmissionTicketView.as_view(), name='admission_ticket'),
+]
@@ -0,0 +1,36 @@
+from django.db.models import CharField, F, Value
+
+from event_registrations.models import SoloEventRegistration, Team, TeamEventRegistration
+
+# fields of the registrations returned by registrations_of_profile
+REGISTRATION_FIELDS = ('public_id', 'is_complete', 'is_confirmed', 'is_reserved', 'created_on',
+                       'event_public_id', 'event_title', 'team_public_id')
+
+
+def registrations_of_profile(profile):
+    """
+        Returns the solo and team registrations of profile for all events, newest first, in a single UNION query.
+        Team registrations are those of the teams led by profile or joined by it.
+        Registrations are dicts of REGISTRATION_FIELDS, team_public_id is None for solo registrations
+    """
+    event_fields = dict(event_public_id=F('event__public_id'), event_title=F('event__title'))
+    solo_registrations = SoloEventRegistration.objects.filter(profile=profile) \
+        .annotate(**event_fields, team_public_id=Value(None, output_field=CharField())) \
+        .values(*REGISTRATION_FIELDS)
+    team_registrations = TeamEventRegistration.objects.filter(team__in=Team.objects.of_profile(profile)) \
+        .annotate(**event_fields, team_public_id=F('team__public_id')) \
+        .values(*REGISTRATION_FIELDS)
+
+    return solo_registrations.union(team_registrations, all=True).order_by('-created_on')
+
+
+def team_size_error(event, team):
+    """
+        Returns why team can not register for the team event, None if its size fits.
+        Teams fetched with Team.objects.with_member_count() are checked without any query
+    """
+    if team.size < event.min_team_size:
+        return f'The team needs at least {event.min_team_size} members for this event'
+    if team.size > event.max_team_size:
+        return f'The team can have at most {event.max_team_size} members for this event'
+    return None
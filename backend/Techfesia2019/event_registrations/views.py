@@ -1,3 +1,200 @@
-from django.shortcuts import render
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from accounts.models import Profile, ProfileOrganizer
+from events.allocation import AlreadyRegistered, claim_seat
+from events.models import Event, TeamEvent, event_resolver
+from events.permissions import IsStaffUser
+from .checkin import NOT_REGISTERED, check_in_registry
+from .exports import EXPORT_FORMATS, participant_rows, render_rows
+from .imports import import_registrations, parse_rows
+from .models import AdmissionTicket, SoloEventRegistration, Team, TeamEventRegistration, team_resolver
+from .serializers import AdmissionTicketSerializer, TeamSerializer
+from .utils import registrations_of_profile, team_size_error
+
+
+class TeamListView(APIView):
+    """
+        Teams of the calling user with their member counts, all teams for staff
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        teams = Team.objects.with_member_count().select_related('team_leader__user').order_by('name')
+        if not request.user.is_staff:
+            profile = Profile.objects.filter(user=request.user).first()
+            teams = teams.of_profile(profile) if profile else teams.none()
+
+        return Response({'teams': TeamSerializer(teams, many=True).data}, status=status.HTTP_200_OK)
+
+
+class ProfileRegistrationsView(APIView):
+    """
+        Solo and team registrations of the calling user for all events, for their dashboard
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        profile = Profile.objects.filter(user=request.user).first()
+        if profile is None:
+            return Response({'registrations': []}, status=status.HTTP_200_OK)
+
+        return Response({'registrations': list(registrations_of_profile(profile))}, status=status.HTTP_200_OK)
+
+
+class EventRegistrationView(APIView):
+    """
+        Registers the calling user for a solo event, or a team led by them for a team event
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, public_id, format=None):
+        event = event_resolver.resolve(public_id)
+        if event is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        profile = Profile.objects.filter(user=request.user).first()
+        if profile is None:
+            return Response({'error': 'A profile is required to register for events'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        team = None
+        if isinstance(event, TeamEvent):
+            if 'team' not in request.data:
+                return Response({'error': 'team parameter is not provided'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            team = team_resolver.resolve(request.data['team'])
+            if team is None:
+                return Response({'error': 'This team does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if team.team_leader_id != profile.id:
+                return Response({'error': 'Only the team leader can register the team'},
+                                status=status.HTTP_403_FORBIDDEN)
+            error = team_size_error(event, team)
+            if error:
+                return Response({'error': error}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        if team is not None:
+            registration = TeamEventRegistration(event_id=event.pk, team=team)
+        else:
+            registration = SoloEventRegistration(event_id=event.pk, profile=profile)
+        error = registration.staff_conflict_error()
+        if error:
+            return Response({'error': error}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        if event.admission_mode == Event.QUEUED_ADMISSION:
+            # accepted right away, the admission worker registers it later
+            ticket = AdmissionTicket.objects.create(event_id=event.pk, profile=profile, team=team)
+            return Response({'ticket': ticket.public_id, 'status': ticket.status}, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            # checks for an existing registration under the event lock
+            got_seat = claim_seat(event, registration)
+        except AlreadyRegistered:
+            return Response({'error': 'Already registered for this event'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response({'registration': registration.public_id,
+                         'status': AdmissionTicket.CONFIRMED if got_seat else AdmissionTicket.WAITING},
+                        status=status.HTTP_201_CREATED)
+
+
+class AdmissionTicketView(APIView):
+    """
+        Status of a queued registration, polled by the client until the admission worker has processed it
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, public_id, format=None):
+        ticket = AdmissionTicket.objects.select_related('profile').filter(public_id=public_id).first()
+        if ticket is None:
+            return Response({'error': 'This ticket does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if ticket.profile.user_id != request.user.id and not request.user.is_staff:
+            return Response({'error': 'You do not have permission to perform this action'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        return Response(AdmissionTicketSerializer(ticket).data, status=status.HTTP_200_OK)
+
+
+class RegistrationImportView(APIView):
+    """
+        Bulk import of on-spot registrations for an event, from a CSV file (Content-Type: text/csv)
+        or a JSON list of rows. See event_registrations.imports for the columns
+    """
+
+    permission_classes = (IsStaffUser,)
+
+    def post(self, request, public_id, format=None):
+        event = event_resolver.resolve(public_id)
+        if event is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        try:
+            if request.content_type.startswith('text/csv'):
+                rows = parse_rows(request.body.decode('utf-8-sig'), 'csv')
+            else:
+                rows = parse_rows(request.body.decode('utf-8'), 'json')
+        except (ValueError, UnicodeError) as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary, errors = import_registrations(event, rows)
+        if errors:
+            return Response({'error': 'Nothing was imported because of invalid rows', 'rows': errors},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(summary, status=status.HTTP_201_CREATED)
+
+
+class CheckInView(APIView):
+    """
+        Check-in of a registration at a venue gate, from the public_id read from its QR code.
+        Answered from memory, see event_registrations.checkin
+    """
+
+    permission_classes = (IsStaffUser,)
+
+    def post(self, request, public_id, format=None):
+        registration = request.data.get('registration')
+        if not registration:
+            return Response({'error': 'registration is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = check_in_registry.check_in(public_id, str(registration), str(request.data.get('gate', ''))[:50])
+        if result is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if result == NOT_REGISTERED:
+            return Response({'error': 'This registration is not confirmed for the event', 'status': result},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response({'status': result}, status=status.HTTP_200_OK)
+
+
+class ParticipantExportView(APIView):
+    """
+        Participant list of an event for staff and its organizers, streamed as CSV (?output=csv, the default)
+        or JSON lines (?output=jsonl). See event_registrations.exports for the columns
+    """
+
+    permission_classes = (IsAuthenticated,)
+    content_types = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+    def get(self, request, public_id, format=None):
+        event = event_resolver.resolve(public_id)
+        if event is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if not request.user.is_staff and \
+                not ProfileOrganizer.objects.filter(profile__user=request.user, events=event.pk).exists():
+            return Response({'error': 'You do not have permission to perform this action'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response({'error': f"output should be one of {', '.join(EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(render_rows(participant_rows(event), output),
+                                         content_type=self.content_types[output])
+        response['Content-Disposition'] = f'attachment; filename="{event.public_id}-participants.{output}"'
+        return response
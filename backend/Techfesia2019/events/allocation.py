@@ -0,0 +1,272 @@
+"""
+    Seat allocation for solo and team events.
+
+    Registrations that are confirmed but not complete wait for a seat. Waiting registrations for reserved slots
+    first take the free reserved seats. The remaining seats then go to the oldest waiting registrations,
+    leaving the free reserved seats empty as long as not all of them are taken.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base.utils import bulk_create_with_public_ids
+from events.utils import bump_registrations_version
+
+# ids per UPDATE statement, keeps the statement under the bound parameter limit of SQLite
+UPDATE_BATCH_SIZE = 500
+
+# seat counters stored on Event and the registrations each of them counts
+SEAT_COUNTERS = {
+    'participants_count': {'is_complete': True},
+    'reserved_participants_count': {'is_complete': True, 'is_reserved': True},
+    'waiting_participants_count': {'is_complete': False, 'is_confirmed': True},
+}
+
+
+class AlreadyRegistered(Exception):
+    """
+        Raised by claim_seat when the profile or team of a new registration is registered for the event already
+    """
+
+
+def seat_state(registration):
+    """
+        Returns the counter -> 0/1 contribution of a solo or team registration to the seat counters of its event
+    """
+    return {counter: int(all(getattr(registration, field) == value for field, value in condition.items()))
+            for counter, condition in SEAT_COUNTERS.items()}
+
+
+def remember_seat_state(registration):
+    """
+        Stores the seat state of registration as it is in the database, so that the next save
+        or delete knows by how much to change the counters. Registrations loaded with any of
+        the state fields deferred are marked unknown, which makes the next change recount their event
+    """
+    deferred = registration.get_deferred_fields()
+    if registration.pk is None:
+        registration._seat_state = None
+    elif deferred & {'event_id', 'is_complete', 'is_confirmed', 'is_reserved'}:
+        registration._seat_state = 'unknown'
+    else:
+        registration._seat_state = (registration.event_id, seat_state(registration))
+
+
+def seat_counter_values(registration_models):
+    """
+        Returns the counter -> expression recomputing every seat counter of an event from its registrations,
+        one correlated subquery per counter and registration model. Used with Event.objects.update()
+    """
+    values = dict()
+    for counter, condition in SEAT_COUNTERS.items():
+        value = Value(0)
+        for model in registration_models:
+            counts = model.objects.filter(event=OuterRef('pk'), **condition) \
+                .order_by().values('event').annotate(count=Count('pk')).values('count')
+            value = value + Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+        values[counter] = value
+    return values
+
+
+def select_promotions(total_seats, reserved_seats, participants, reserved_participants, waiting):
+    """
+        Works out which waiting registrations get a seat.
+        waiting is the list of (id, is_reserved) of the waiting registrations, oldest first.
+        Returns the ids to promote, in the order they get their seats
+    """
+    free_reserved_seats = max(reserved_seats - reserved_participants, 0)
+    promoted = [pk for pk, is_reserved in waiting if is_reserved][:free_reserved_seats]
+    participants += len(promoted)
+    reserved_participants += len(promoted)
+
+    if reserved_participants >= reserved_seats:
+        # all reserved slots are taken, consider all registrations general
+        free_seats = total_seats - participants
+    else:
+        # leave the seats for reserved candidates
+        free_seats = (total_seats - reserved_seats) - (participants - reserved_participants)
+
+    promoted_ids = set(promoted)
+    remaining = [pk for pk, _ in waiting if pk not in promoted_ids]
+    return promoted + remaining[:max(free_seats, 0)]
+
+
+def lock_event(event):
+    """
+        Locks the row of event until the end of the current transaction, so that seats are counted and given
+        by one transaction at a time. Databases without row locks (SQLite) get their write lock taken instead
+        by a no-op UPDATE, before anything is read.
+        Returns the capacity and the seat counters of the event as read under the lock
+    """
+    return _lock(type(event).objects.filter(pk=event.pk))
+
+
+def _lock(events):
+    if connection.features.has_select_for_update:
+        events = events.select_for_update()
+    else:
+        events.update(max_participants=F('max_participants'))
+
+    return events.values('max_participants', 'reserved_slots', *SEAT_COUNTERS).get()
+
+
+def _promote(event_id, events, waiting, promoted, reserved):
+    """
+        Gives seats to the promoted ids of the waiting registrations and moves the counters of the event,
+        events being the queryset of the event and reserved the number of promoted registrations for reserved slots
+    """
+    now = timezone.now()
+    for start in range(0, len(promoted), UPDATE_BATCH_SIZE):
+        waiting.filter(pk__in=promoted[start:start + UPDATE_BATCH_SIZE]).update(is_complete=True, updated_on=now)
+
+    events.adjust_seat_counters(participants_count=len(promoted),
+                                reserved_participants_count=reserved,
+                                waiting_participants_count=-len(promoted))
+    bump_registrations_version(event_id)
+
+
+def _allocate(event, seats):
+    if not seats['waiting_participants_count']:
+        return []
+    if seats['reserved_participants_count'] >= seats['reserved_slots'] and \
+            seats['participants_count'] >= seats['max_participants']:
+        # the event is full
+        return []
+
+    waiting = list(event.current_waiting_participants()
+                   .order_by('created_on', 'pk')
+                   .values_list('pk', 'is_reserved'))
+    promoted = select_promotions(seats['max_participants'], seats['reserved_slots'],
+                                 seats['participants_count'], seats['reserved_participants_count'], waiting)
+    if promoted:
+        promoted_ids = set(promoted)
+        reserved = sum(1 for pk, is_reserved in waiting if is_reserved and pk in promoted_ids)
+        _promote(event.pk, type(event).objects.filter(pk=event.pk), event.current_waiting_participants(),
+                 promoted, reserved)
+
+    return promoted
+
+
+@transaction.atomic
+def allocate_seats(event):
+    """
+        Promotes the waiting registrations of a SoloEvent or TeamEvent that can get a seat.
+        The event is locked first, so concurrent allocations can never give more seats than there are.
+        Seats are counted from the counters of the event; the waiting list is read only when a seat is free.
+        Promotions are written with bulk UPDATEs. Returns the ids of the promoted registrations
+    """
+    return _allocate(event, lock_event(event))
+
+
+@transaction.atomic
+def admit_registrations(event, registrations):
+    """
+        Saves new registrations to the waiting list of event, in the given order, and gives seats to the ones that
+        can get one, all in one transaction holding the event lock. Older waiting registrations are served first.
+        Returns the set of ids of the registrations that got a seat
+    """
+    return _admit(event, lock_event(event), registrations)
+
+
+def _admit(event, seats, registrations):
+    for registration in registrations:
+        registration.event = event
+        registration.is_confirmed = True
+        registration.is_complete = False
+        registration.save()
+    # the counters in the database were changed by the post_save signal of the registrations
+    seats['waiting_participants_count'] += len(registrations)
+
+    promoted = set(_allocate(event, seats))
+    for registration in registrations:
+        if registration.pk in promoted:
+            registration.is_complete = True
+            remember_seat_state(registration)
+    return promoted
+
+
+@transaction.atomic
+def bulk_admit_registrations(event, registrations):
+    """
+        Like admit_registrations, for large batches: registrations are inserted with chunked bulk_create
+        and the counters of the event are moved once. Registrations without a public_id get one allocated.
+        Returns the ids of the registrations promoted by the allocation that follows
+    """
+    seats = lock_event(event)
+    for registration in registrations:
+        registration.event = event
+        registration.is_confirmed = True
+        registration.is_complete = False
+    bulk_create_with_public_ids(type(registrations[0]), registrations, batch_size=UPDATE_BATCH_SIZE)
+
+    # bulk_create sends no signals
+    type(event).objects.filter(pk=event.pk).adjust_seat_counters(waiting_participants_count=len(registrations))
+    bump_registrations_version(event.pk)
+    seats['waiting_participants_count'] += len(registrations)
+    return _allocate(event, seats)
+
+
+def registrant(registration):
+    """
+        Returns the lookup of the profile registered by a solo registration or of the team registered by a team one
+    """
+    if hasattr(registration, 'team_id'):
+        return {'team_id': registration.team_id}
+    return {'profile_id': registration.profile_id}
+
+
+@transaction.atomic
+def claim_seat(event, registration):
+    """
+        Saves a new registration to the waiting list of event and gives it a seat if one is free.
+        Returns True if the registration got a seat. Raises AlreadyRegistered if its profile or team is registered
+        for event already, which is checked under the event lock so that concurrent requests can not both register
+    """
+    seats = lock_event(event)
+    if type(registration).objects.filter(event_id=event.pk, **registrant(registration)).exists():
+        raise AlreadyRegistered("Already registered for this event")
+
+    promoted = _admit(event, seats, [registration])
+    return registration.pk in promoted
+
+
+@transaction.atomic
+def cancel_registration(registration):
+    """
+        Deletes a solo or team registration and, if it held a seat, gives the seat to the next waiting registration
+        in the same transaction: the oldest one for a reserved slot while reserved slots are free, else the oldest one.
+        Costs a constant number of queries however many registrations the event has.
+        Returns the id of the promoted registration or None
+    """
+    events = registration._meta.get_field('event').related_model.objects.filter(pk=registration.event_id)
+    seats = _lock(events)
+
+    # the registration may have got its seat since it was loaded
+    registration.refresh_from_db(fields=['is_complete', 'is_confirmed', 'is_reserved'])
+    remember_seat_state(registration)
+    held = seat_state(registration)
+    registration.delete()
+
+    if not held['participants_count']:
+        return None
+    for counter, value in held.items():
+        seats[counter] -= value
+
+    waiting = type(registration).objects.filter(event_id=registration.event_id,
+                                                **SEAT_COUNTERS['waiting_participants_count'])
+    waiting_head = waiting.order_by('created_on', 'pk').values_list('pk', 'is_reserved')
+    candidate = None
+    if seats['reserved_participants_count'] < seats['reserved_slots']:
+        # each lookup reads the head of an index on the waiting list
+        candidate = waiting_head.filter(is_reserved=True).first()
+    if candidate is None:
+        candidate = waiting_head.first()
+    if candidate is None or not select_promotions(seats['max_participants'], seats['reserved_slots'],
+                                                  seats['participants_count'], seats['reserved_participants_count'],
+                                                  [candidate]):
+        return None
+
+    pk, is_reserved = candidate
+    _promote(registration.event_id, events, waiting, [pk], int(is_reserved))
+    return pk
@@ -0,0 +1,110 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Profile
+from base.utils import allocate_public_ids, generate_random_string
+from event_registrations.models import SoloEventRegistration
+from events.allocation import allocate_seats
+from events.models import Event, SoloEvent
+from registration.models import User
+
+
+def legacy_refresh_participants(event):
+    """
+        The loop SoloEvent.refresh_participants used before the allocation engine, kept for comparison
+    """
+    total_seats = event.max_participants
+    total_reserved_seats = event.reserved_slots
+    while event.current_waiting_reserved_participants().count() != 0:
+        if event.current_reserved_participants().count() < total_reserved_seats:
+            registration = event.current_waiting_reserved_participants().order_by('created_on')[0]
+            registration.is_complete = True
+            registration.save()
+        else:
+            break
+    if event.current_reserved_participants().count() >= total_reserved_seats:
+        while event.current_waiting_participants().count() != 0:
+            if event.current_participants().count() < total_seats:
+                registration = event.current_waiting_participants().order_by('created_on')[0]
+                registration.is_complete = True
+                registration.save()
+            else:
+                break
+    else:
+        while event.current_waiting_participants().count() != 0:
+            if event.current_participants().filter(is_reserved=False).count() < total_seats - total_reserved_seats:
+                registration = event.current_waiting_participants().order_by('created_on')[0]
+                registration.is_complete = True
+                registration.save()
+            else:
+                break
+
+
+class Command(BaseCommand):
+    help = "Compares the seat allocation engine with the old refresh_participants loop. " \
+           "Creates a temporary event with waiting registrations, nothing is left in the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registrations', type=int, default=500, help="number of waiting registrations")
+        parser.add_argument('--seats', type=int, default=400, help="max participants of the event")
+        parser.add_argument('--reserved-slots', type=int, default=50)
+        parser.add_argument('--reserved-every', type=int, default=5,
+                            help="every n-th registration is for a reserved slot")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            event = self.create_event(options)
+
+            legacy = self.run(legacy_refresh_participants, event)
+            legacy_promoted = set(event.current_participants().values_list('pk', flat=True))
+
+            event.current_participants().update(is_complete=False)
+            Event.objects.filter(pk=event.pk).reconcile_seat_counters()
+            engine = self.run(allocate_seats, event)
+            engine_promoted = set(event.current_participants().values_list('pk', flat=True))
+
+            transaction.set_rollback(True)
+
+        for name, (queries, seconds) in (('refresh loop', legacy), ('allocation engine', engine)):
+            self.stdout.write(f"{name:>20}: {queries:>6} queries {seconds * 1000:>10.1f} ms")
+        if legacy_promoted == engine_promoted:
+            self.stdout.write(self.style.SUCCESS(f"Both promoted the same {len(engine_promoted)} registrations"))
+        else:
+            self.stdout.write(self.style.ERROR("The engine and the loop promoted different registrations"))
+
+    @staticmethod
+    def run(allocate, event):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            allocate(event)
+            seconds = time.perf_counter() - start
+        return len(queries), seconds
+
+    @staticmethod
+    def create_event(options):
+        prefix = generate_random_string(6)
+        today = datetime.date.today()
+        event = SoloEvent.objects.create(title=f'allocation benchmark {prefix}',
+                                         start_date=today, start_time=datetime.time(10, 0),
+                                         end_date=today, end_time=datetime.time(18, 0),
+                                         max_participants=options['seats'],
+                                         reserved_slots=options['reserved_slots'])
+
+        count = options['registrations']
+        User.objects.bulk_create([User(username=f'{prefix}_{i}', password='!') for i in range(count)])
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        Profile.objects.bulk_create([Profile(user=user, phone_number='+910000000000') for user in users])
+        profiles = Profile.objects.filter(user__username__startswith=f'{prefix}_').order_by('pk')
+
+        SoloEventRegistration.objects.bulk_create([
+            SoloEventRegistration(public_id=public_id, event=event, profile=profile, is_confirmed=True,
+                                  is_reserved=i % options['reserved_every'] == 0)
+            for i, (profile, public_id) in enumerate(zip(profiles, allocate_public_ids(count)))
+        ])
+        # bulk_create sends no signals
+        Event.objects.filter(pk=event.pk).reconcile_seat_counters()
+        return event
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Recomputes the seat counters of events from their registrations. " \
+           "Counters are kept up to date on every registration change, this repairs them after bulk edits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('public_ids', nargs='*', help="events to reconcile, all events if none are given")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['public_ids']:
+            events = events.filter(public_id__in=options['public_ids'])
+            missing = set(options['public_ids']) - set(events.values_list('public_id', flat=True))
+            if missing:
+                raise CommandError(f"Events not found: {', '.join(sorted(missing))}")
+
+        updated = events.reconcile_seat_counters()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled the seat counters of {updated} events"))
@@ -0,0 +1,120 @@
+import datetime
+import multiprocessing
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from accounts.models import Profile
+from base.utils import generate_random_string
+from event_registrations.models import SoloEventRegistration
+from events.allocation import claim_seat
+from events.models import SoloEvent
+from registration.models import User
+
+# attempts per registration when the database reports a lock timeout
+MAX_ATTEMPTS = 20
+
+
+def register(event_id, profile_ids):
+    """
+        Registers each profile for the event through claim_seat.
+        Returns the number of seats given and the number of registrations that failed
+    """
+    event = SoloEvent.objects.get(pk=event_id)
+    seats = errors = 0
+    for profile_id in profile_ids:
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                seats += claim_seat(event, SoloEventRegistration(profile_id=profile_id))
+                break
+            except OperationalError:
+                # SQLite gives up waiting for the write lock after its timeout
+                time.sleep(0.01 * (attempt + 1))
+        else:
+            errors += 1
+
+    connections.close_all()
+    return seats, errors
+
+
+def register_in_process(args):
+    import django
+    django.setup()
+    return register(*args)
+
+
+class Command(BaseCommand):
+    help = "Registers many profiles for one event concurrently, from threads or processes, " \
+           "and checks that no more seats are given than the event has. Creates a temporary event and " \
+           "profiles in the configured database and deletes them afterwards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registrations', type=int, default=200)
+        parser.add_argument('--seats', type=int, default=50, help="max participants of the event")
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--processes', action='store_true', help="use processes instead of threads")
+
+    def handle(self, *args, **options):
+        prefix = generate_random_string(6)
+        event, profile_ids = self.create_data(prefix, options)
+        chunks = [(event.pk, profile_ids[i::options['workers']]) for i in range(options['workers'])]
+
+        try:
+            start = time.perf_counter()
+            if options['processes']:
+                # forked processes must not share the connection of the parent
+                connections.close_all()
+                with multiprocessing.Pool(options['workers']) as pool:
+                    results = pool.map(register_in_process, chunks)
+            else:
+                results = self.run_threads(chunks)
+            seconds = time.perf_counter() - start
+
+            seats = sum(result[0] for result in results)
+            errors = sum(result[1] for result in results)
+            participants = event.current_participants().count()
+            oversold = max(participants - event.max_participants, 0)
+
+            self.stdout.write(f"{len(profile_ids) - errors} registrations in {seconds:.2f} s "
+                              f"({(len(profile_ids) - errors) / seconds:.1f}/s), {errors} failed")
+            self.stdout.write(f"{seats} seats given, {participants} participants for {event.max_participants} seats")
+            if oversold or seats != participants:
+                self.stdout.write(self.style.ERROR(f"Oversold by {oversold} seats"))
+            else:
+                self.stdout.write(self.style.SUCCESS("No seat was given twice"))
+        finally:
+            SoloEventRegistration.objects.filter(event=event).delete()
+            event.delete()
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
+
+    @staticmethod
+    def run_threads(chunks):
+        results = [None] * len(chunks)
+
+        def work(index, chunk):
+            results[index] = register(*chunk)
+
+        threads = [threading.Thread(target=work, args=(index, chunk)) for index, chunk in enumerate(chunks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def create_data(prefix, options):
+        today = datetime.date.today()
+        event = SoloEvent.objects.create(title=f'registration stress test {prefix}',
+                                         start_date=today, start_time=datetime.time(10, 0),
+                                         end_date=today, end_time=datetime.time(18, 0),
+                                         max_participants=options['seats'], reserved_slots=0)
+
+        User.objects.bulk_create([User(username=f'{prefix}_{i}', password='!')
+                                  for i in range(options['registrations'])])
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        Profile.objects.bulk_create([Profile(user=user, phone_number='+910000000000') for user in users])
+        profile_ids = list(Profile.objects.filter(user__username__startswith=f'{prefix}_')
+                           .order_by('pk').values_list('pk', flat=True))
+        return event, profile_ids
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+SQLITE_SEARCH_TABLE = 'events_event_search'
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(venue, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+"""
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_SEARCH_TABLE}
+            USING fts5(title, description, venue, tokenize = 'porter unicode61')
+        """)
+        schema_editor.execute(f"""
+            INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, title, description, venue)
+            SELECT id, title, coalesce(description, ''), venue FROM events_event
+        """)
+    elif vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE events_event ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS events_event_search_vector_gin "
+                              "ON events_event USING GIN (search_vector)")
+        schema_editor.execute(f"UPDATE events_event SET search_vector = {POSTGRES_DOCUMENT}")
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_SEARCH_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS events_event_search_vector_gin")
+        schema_editor.execute("ALTER TABLE events_event DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_auto_20190707_0703'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_date', 'start_time'], name='event_start_idx'),
+        ),
+        # the auto created through tables are only indexed (event_id, ...) first,
+        # filtering events by category or tag needs the reverse order
+        migrations.RunSQL(
+            'CREATE INDEX event_category_lookup_idx ON events_event_category (category_id, event_id)',
+            'DROP INDEX event_category_lookup_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX event_tags_lookup_idx ON events_event_tags (tags_id, event_id)',
+            'DROP INDEX event_tags_lookup_idx',
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:18
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# the registrations counted by each counter, as they were when the counters were added
+SEAT_COUNTERS = {
+    'participants_count': {'is_complete': True},
+    'reserved_participants_count': {'is_complete': True, 'is_reserved': True},
+    'waiting_participants_count': {'is_complete': False, 'is_confirmed': True},
+}
+
+
+def count_seats(apps, schema_editor):
+    registration_models = [apps.get_model('event_registrations', 'SoloEventRegistration'),
+                           apps.get_model('event_registrations', 'TeamEventRegistration')]
+    values = dict()
+    for counter, condition in SEAT_COUNTERS.items():
+        value = Value(0)
+        for model in registration_models:
+            counts = model.objects.filter(event=OuterRef('pk'), **condition) \
+                .order_by().values('event').annotate(count=Count('pk')).values('count')
+            value = value + Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+        values[counter] = value
+    apps.get_model('events', 'Event').objects.update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_filter_indexes'),
+        ('event_registrations', '0003_registration_is_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='participants_count',
+            field=models.IntegerField(default=0, editable=False, help_text='No of registrations holding a seat'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='reserved_participants_count',
+            field=models.IntegerField(default=0, editable=False, help_text='No of registrations holding a reserved seat'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waiting_participants_count',
+            field=models.IntegerField(default=0, editable=False, help_text='No of registrations waiting for a seat'),
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+    ]
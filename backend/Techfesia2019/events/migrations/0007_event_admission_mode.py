@@ -0,0 +1,18 @@
+# Generated by Django 2.2.2 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_seat_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='admission_mode',
+            field=models.CharField(choices=[('direct', 'Seats are given while registering'), ('queued', 'Registrations are queued and seats are given by the admission worker')], default='direct', help_text='Hot events queue their registrations to be admitted in batches', max_length=10),
+        ),
+    ]
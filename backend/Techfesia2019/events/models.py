@@ -1,8 +1,14 @@
-from django.db import models
-import datetime
+from django.apps import apps
+from django.db import models, transaction
 
 # Create your models here.
-from base.utils import generate_random_string, generate_public_id
+from django.db.models import F, signals
+from django.dispatch import receiver
+
+from base.utils import PublicIdResolver, save_with_public_id
+from events import search
+from events.allocation import SEAT_COUNTERS, allocate_seats, lock_event, seat_counter_values
+from events.utils import bump_catalog_version, bump_cache_version, vocabulary_version_key
 
 
 class Team(models.Model):
@@ -25,7 +31,53 @@ class Tags(models.Model):
         return self.name
 
 
+class EventQuerySet(models.QuerySet):
+
+    def with_details(self):
+        """
+            Joins the solo/team child tables and prefetches categories and tags in bulk,
+            so that a whole listing of mixed events can be serialized in a constant number of queries.
+            Must be called on Event.objects
+        """
+        return self.select_related('soloevent', 'teamevent').prefetch_related('category', 'tags')
+
+    def adjust_seat_counters(self, **deltas):
+        """
+            Atomically adds deltas to the seat counters of the events, e.g. adjust_seat_counters(participants_count=1)
+        """
+        counters = {counter: F(counter) + delta for counter, delta in deltas.items() if delta}
+        if counters:
+            self.update(**counters)
+
+    def reconcile_seat_counters(self):
+        """
+            Recomputes the seat counters of the events from their registrations in a single UPDATE.
+            Must be called on Event.objects. Returns the number of events updated
+        """
+        registration_models = [Event._meta.get_field(relation).related_model
+                               for relation in ('soloeventregistration', 'teameventregistration')]
+        return self.update(**seat_counter_values(registration_models))
+
+
+class EventHasRegistrations(ValueError):
+    """
+        Raised by Event.convert_to for events with registrations or pending admission tickets.
+        registrations holds their public_ids
+    """
+
+    def __init__(self, registrations):
+        super().__init__("Events with registrations can not be converted")
+        self.registrations = registrations
+
+
 class Event(models.Model):
+    DIRECT_ADMISSION = 'direct'
+    QUEUED_ADMISSION = 'queued'
+    ADMISSION_MODES = (
+        (DIRECT_ADMISSION, 'Seats are given while registering'),
+        (QUEUED_ADMISSION, 'Registrations are queued and seats are given by the admission worker'),
+    )
+
     public_id = models.CharField(max_length=100,
                                  unique=True,
                                  blank=True,
@@ -70,11 +122,74 @@ class Event(models.Model):
 
     reserved_slots = models.IntegerField(default=0, help_text="No of participant slots reserved for external players")
 
-    def save(self, *args, **kwargs):
-        if not self.public_id:
-            self.public_id = generate_public_id(self)
+    admission_mode = models.CharField(max_length=10,
+                                      choices=ADMISSION_MODES,
+                                      default=DIRECT_ADMISSION,
+                                      help_text="Hot events queue their registrations to be admitted in batches"
+                                      )
+
+    participants_count = models.IntegerField(default=0, editable=False,
+                                             help_text="No of registrations holding a seat")
+
+    reserved_participants_count = models.IntegerField(default=0, editable=False,
+                                                      help_text="No of registrations holding a reserved seat")
+
+    waiting_participants_count = models.IntegerField(default=0, editable=False,
+                                                     help_text="No of registrations waiting for a seat")
+
+    objects = EventQuerySet.as_manager()
 
-        super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # used by the date range filters and the keyset pagination of the events list
+            models.Index(fields=['start_date', 'start_time'], name='event_start_idx'),
+        ]
+
+    @property
+    def seats_left(self):
+        return max(self.max_participants - self.participants_count, 0)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.keys() <= {'using'}:
+            # the seat counters are only changed by F() updates, saving the copy loaded
+            # with this event would undo the registrations made since it was loaded
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in SEAT_COUNTERS]
+
+        save_with_public_id(self, super().save, *args, **kwargs)
+        search.index_event(self)
+
+    @transaction.atomic
+    def convert_to(self, event_class, **fields):
+        """
+            Converts a solo event into a team event or vice versa.
+            Only the row of the child table is replaced. The parent Event row keeps its id and public_id,
+            so categories, tags and organizers pointing to it are left untouched.
+            Registrations are of one kind only, so events with registrations or pending admission tickets
+            can not be converted, EventHasRegistrations is raised for them.
+            fields are the values of the fields specific to event_class. Returns the converted event
+        """
+        # registrations are made under the lock of the event, none can be added until the conversion is done
+        lock_event(self)
+        registrations = list(self.soloeventregistration_set.values_list('public_id', flat=True)) + \
+            list(self.teameventregistration_set.values_list('public_id', flat=True)) + \
+            list(self.admissionticket_set.filter(status='pending').values_list('public_id', flat=True))
+        if registrations:
+            raise EventHasRegistrations(registrations)
+
+        # delete() clears the primary key of self
+        pk = self.pk
+        # deletes the child row only
+        self.delete(keep_parents=True)
+
+        converted = event_class(**fields)
+        for field in Event._meta.concrete_fields:
+            setattr(converted, field.attname, getattr(self, field.attname))
+        converted.event_ptr_id = pk
+        # raw saves skip the parents, so only the new child row is inserted
+        converted.save_base(raw=True)
+
+        return converted
 
 
 class SoloEvent(Event):
@@ -96,36 +211,7 @@ class SoloEvent(Event):
         return self.soloeventregistration_set.filter(is_complete=False, is_confirmed=True, is_reserved=True)
 
     def refresh_participants(self):
-        total_seats = self.max_participants
-        total_reserved_seats = self.reserved_slots
-        # If reserved registrations are available
-        while self.current_waiting_reserved_participants().count() is not 0:
-            # If reserved seats are available
-            if self.current_reserved_participants().count() < total_reserved_seats:
-                registration = self.current_waiting_reserved_participants().order_by('created_on')[0]
-                registration.is_complete = True
-                registration.save()
-            else:
-                break
-        # If All Reserved Slots are full
-        if self.current_reserved_participants().count() >= total_reserved_seats:
-            while self.current_waiting_participants().count() is not 0:
-                # Consider all registrations general
-                if self.current_participants().count() < total_seats:
-                    registration = self.current_waiting_participants().order_by('created_on')[0]
-                    registration.is_complete = True
-                    registration.save()
-                else:
-                    break
-        else:
-            while self.current_waiting_participants().count() is not 0:
-                # Leave seats for Reserved Candidates
-                if self.current_participants().filter(is_reserved=False).count() < total_seats - total_reserved_seats:
-                    registration = self.current_waiting_participants().order_by('created_on')[0]
-                    registration.is_complete = True
-                    registration.save()
-                else:
-                    break
+        return allocate_seats(self)
 
 
 class TeamEvent(Event):
@@ -137,13 +223,13 @@ class TeamEvent(Event):
         return 'team'
 
     def find_registration(self, user):
-        if self.teameventregistration_set.filter(team__team_leader=user.profile).count() is 0:
-            if self.teameventregistration_set.filter(team__teammember_set__profile=user.profile).count() is not 0:
-                return self.teameventregistration_set.filter(team__teammember_set__profile=user.profile)[0]
-            else:
-                return None
-        else:
-            return self.teameventregistration_set.filter(team__team_leader__user=user)[0]
+        """
+            Returns the registration of the team of user for this event, None if none of the teams led by user
+            or joined by user is registered. Costs a single query once user.profile is loaded
+        """
+        # event_registrations imports this module
+        teams = apps.get_model('event_registrations', 'Team').objects.of_profile(user.profile)
+        return self.teameventregistration_set.filter(team__in=teams).first()
 
     def current_participants(self):
         return self.teameventregistration_set.filter(is_complete=True)
@@ -158,33 +244,44 @@ class TeamEvent(Event):
         return self.teameventregistration_set.filter(is_complete=False, is_confirmed=True, is_reserved=True)
 
     def refresh_participants(self):
-        total_seats = self.max_participants
-        total_reserved_seats = self.reserved_slots
-        # If reserved registrations are available
-        while self.current_waiting_reserved_participants().count() is not 0:
-            # If reserved seats are available
-            if self.current_reserved_participants().count() < total_reserved_seats:
-                registration = self.current_waiting_reserved_participants().order_by('created_on')[0]
-                registration.is_complete = True
-                registration.save()
-            else:
-                break
-        # If All Reserved Slots are full
-        if self.current_reserved_participants().count() >= total_reserved_seats:
-            while self.current_waiting_participants().count() is not 0:
-                # Consider all registrations general
-                if self.current_participants().count() < total_seats:
-                    registration = self.current_waiting_participants().order_by('created_on')[0]
-                    registration.is_complete = True
-                    registration.save()
-                else:
-                    break
-        else:
-            while self.current_waiting_participants().count() is not 0:
-                # Leave seats for Reserved Candidates
-                if self.current_participants().filter(is_reserved=False).count() < total_seats - total_reserved_seats:
-                    registration = self.current_waiting_participants().order_by('created_on')[0]
-                    registration.is_complete = True
-                    registration.save()
-                else:
-                    break
+        return allocate_seats(self)
+
+
+# finds solo and team events by public_id
+event_resolver = PublicIdResolver(Event, subtypes=(SoloEvent, TeamEvent))
+
+
+@receiver(signals.m2m_changed, sender=Event.category.through)
+@receiver(signals.m2m_changed, sender=Event.tags.through)
+@receiver([signals.post_save, signals.post_delete], sender=Category)
+@receiver([signals.post_save, signals.post_delete], sender=Tags)
+@receiver([signals.post_save, signals.post_delete], sender=Event)
+@receiver([signals.post_save, signals.post_delete], sender=SoloEvent)
+@receiver([signals.post_save, signals.post_delete], sender=TeamEvent)
+def invalidate_event_catalog(sender, **kwargs):
+    """
+        Any change to events, their categories or their tags invalidates the cached public catalog
+    """
+
+    bump_catalog_version()
+
+
+@receiver(signals.post_delete, sender=Event)
+def remove_event_from_search_index(sender, instance, **kwargs):
+    """
+        Deleting a solo or team event also deletes its parent Event row, which sends this signal
+    """
+
+    search.remove_event(instance.id)
+
+
+@receiver([signals.post_save, signals.post_delete], sender=Category)
+@receiver([signals.post_save, signals.post_delete], sender=Tags)
+def invalidate_vocabulary(sender, **kwargs):
+    """
+        Makes every process reload its name -> id cache of categories or tags once the change is committed
+    """
+
+    key = vocabulary_version_key(sender)
+    # the vocabularies do not remember names read inside the transaction, a rollback needs no bump
+    transaction.on_commit(lambda: bump_cache_version(key))
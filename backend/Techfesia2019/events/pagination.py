@@ -0,0 +1,98 @@
+import base64
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+EVENT_ORDERING = ('start_date', 'start_time', 'id')
+
+
+def get_page_size(request):
+    """
+        Reads page_size from the query params. Raises ValueError for invalid values.
+        Page size is capped at settings.EVENTS_MAX_PAGE_SIZE
+    """
+    if 'page_size' not in request.query_params:
+        return settings.EVENTS_PAGE_SIZE
+
+    page_size = int(request.query_params['page_size'])
+    if page_size < 1:
+        raise ValueError("page_size must be positive")
+
+    return min(page_size, settings.EVENTS_MAX_PAGE_SIZE)
+
+
+def encode_cursor(event):
+    position = f'{event.start_date.isoformat()}|{event.start_time.isoformat()}|{event.id}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+        Returns the (start_date, start_time, id) position stored in a cursor. Raises ValueError for invalid cursors
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start_date, start_time, event_id = position.split('|')
+    except (TypeError, UnicodeError, base64.binascii.Error):
+        raise ValueError("Invalid cursor")
+
+    return (datetime.date.fromisoformat(start_date),
+            datetime.time.fromisoformat(start_time),
+            int(event_id))
+
+
+def encode_rank_cursor(event):
+    position = f'rank|{event.search_rank!r}|{event.id}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_rank_cursor(cursor):
+    """
+        Returns the (search_rank, id) position stored in a cursor of search results.
+        Raises ValueError for invalid cursors
+    """
+    try:
+        prefix, search_rank, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (TypeError, UnicodeError, base64.binascii.Error):
+        raise ValueError("Invalid cursor")
+    if prefix != 'rank':
+        raise ValueError("Invalid cursor")
+
+    return float(search_rank), int(event_id)
+
+
+def paginate_events(queryset, cursor, page_size):
+    """
+        Keyset pagination over (start_date, start_time, id).
+        Only the rows of the requested page are read, so the cost of a page does not depend on its position.
+        Returns the events of the page and the cursor of the next page (None on the last page)
+    """
+    queryset = queryset.order_by(*EVENT_ORDERING)
+
+    if cursor:
+        start_date, start_time, event_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(start_date__gt=start_date) |
+                                   Q(start_date=start_date, start_time__gt=start_time) |
+                                   Q(start_date=start_date, start_time=start_time, id__gt=event_id))
+
+    # fetching one extra row tells whether a next page exists
+    events = list(queryset[:page_size + 1])
+    if len(events) > page_size:
+        events = events[:page_size]
+        return events, encode_cursor(events[-1])
+
+    return events, None
+
+
+def paginate_ranked_events(queryset, page_size):
+    """
+        Keyset pagination of search results over (search_rank, id), see events.search.search_events.
+        Returns the events of the page and the cursor of the next page (None on the last page)
+    """
+    events = list(queryset.order_by('search_rank', 'id')[:page_size + 1])
+    if len(events) > page_size:
+        events = events[:page_size]
+        return events, encode_rank_cursor(events[-1])
+
+    return events, None
@@ -0,0 +1,87 @@
+"""
+    Full text search over the title, description and venue of events.
+
+    SQLite (dev/test) keeps a FTS5 virtual table whose rowid is the event id.
+    Postgres (production) keeps a weighted tsvector column on events_event with a GIN index.
+    Both are created by migration 0004 and are updated whenever an event is saved or deleted.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+SQLITE_SEARCH_TABLE = 'events_event_search'
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(venue, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+"""
+
+
+def index_event(event):
+    """
+        Writes the searchable fields of event to the search index
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = %s", [event.id])
+            cursor.execute(f"INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, title, description, venue) "
+                           f"VALUES (%s, %s, %s, %s)",
+                           [event.id, event.title, event.description or '', event.venue])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f"UPDATE events_event SET search_vector = {POSTGRES_DOCUMENT} WHERE id = %s", [event.id])
+
+
+def remove_event(event_id):
+    # postgres keeps the vector on the event row itself, so it goes away with the row
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = %s", [event_id])
+
+
+def search_events(queryset, query, after=None):
+    """
+        Restricts queryset to the events matching query and annotates them with search_rank, lower is more relevant.
+        after is the (search_rank, id) of the last event of the previous page, only the events ranked after it are kept,
+        so a page of results is one lookup in the search index however deep it is.
+        Every word of the query must match. On SQLite words also match as prefixes.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        # keeps search_rank, the results are ordered by it
+        return queryset.none().extra(select={'search_rank': '0.0'})
+
+    if connection.vendor == 'sqlite':
+        # quoting every word keeps user input from being parsed as FTS5 query syntax
+        match = ' '.join(f'"{word}"*' for word in words)
+        # bm25() instead of rank, rank can not be compared in the WHERE clause
+        rank = f'bm25({SQLITE_SEARCH_TABLE})'
+        queryset = queryset.extra(tables=[SQLITE_SEARCH_TABLE],
+                                  where=[f'{SQLITE_SEARCH_TABLE} MATCH %s',
+                                         f'{SQLITE_SEARCH_TABLE}.rowid = events_event.id'],
+                                  params=[match],
+                                  select={'search_rank': rank})
+        rank_params = []
+    elif connection.vendor == 'postgresql':
+        # negated so that both databases rank the best match lowest
+        rank = "-ts_rank(events_event.search_vector, plainto_tsquery('english', %s))::float8"
+        rank_params = [' '.join(words)]
+        queryset = queryset.extra(where=["events_event.search_vector @@ plainto_tsquery('english', %s)"],
+                                  params=rank_params,
+                                  select={'search_rank': rank}, select_params=rank_params)
+    else:
+        # other databases fall back to an unranked table scan
+        condition = Q()
+        for word in words:
+            condition &= Q(title__icontains=word) | Q(description__icontains=word) | Q(venue__icontains=word)
+        rank = '0.0'
+        rank_params = []
+        queryset = queryset.filter(condition).extra(select={'search_rank': rank})
+
+    if after is not None:
+        search_rank, event_id = after
+        queryset = queryset.extra(where=[f'({rank} > %s OR ({rank} = %s AND events_event.id > %s))'],
+                                  params=rank_params + [search_rank] + rank_params + [search_rank, event_id])
+
+    return queryset
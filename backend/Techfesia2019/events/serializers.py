@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from events.models import Tags, Category, Event, SoloEvent, TeamEvent
+from events.models import Tags, Category, Event, SoloEvent, TeamEvent, event_resolver
 
 
 class TagsSerializer(serializers.ModelSerializer):
@@ -14,9 +14,57 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['name', 'description']
 
 
+class NestedTagsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tags
+        fields = ['id', 'name', 'description']
+
+
+class NestedCategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'description']
+
+
 class EventSerializer(serializers.ModelSerializer):
-    category = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
-    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+    """
+        Serializes events fetched from the Event base table using Event.objects.with_details().
+        Team specific fields are read from the joined teamevent row and dropped for solo events.
+        Categories and tags are nested like in SoloEventSerializer and TeamEventSerializer, read from the prefetch.
+    """
+    category = NestedCategorySerializer(many=True, read_only=True)
+    tags = NestedTagsSerializer(many=True, read_only=True)
+    min_team_size = serializers.SerializerMethodField()
+    max_team_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Event
+        fields = ['public_id', 'event_picture', 'event_logo', 'title',
+                  'description', 'start_date', 'start_time', 'end_date',
+                  'end_time', 'venue', 'team_event', 'min_team_size',
+                  'max_team_size', 'category', 'tags',
+                  'max_participants', 'reserved_slots', 'admission_mode']
+
+    @staticmethod
+    def _team_event(obj):
+        event = event_resolver.concrete(obj)
+        return event if isinstance(event, TeamEvent) else None
+
+    def get_min_team_size(self, obj):
+        team_event = self._team_event(obj)
+        return team_event.min_team_size if team_event else None
+
+    def get_max_team_size(self, obj):
+        team_event = self._team_event(obj)
+        return team_event.max_team_size if team_event else None
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self._team_event(instance) is None:
+            # solo events do not have team sizes
+            data.pop('min_team_size')
+            data.pop('max_team_size')
+        return data
 
 
 class SoloEventSerializer(serializers.ModelSerializer):
@@ -26,7 +74,7 @@ class SoloEventSerializer(serializers.ModelSerializer):
         fields = ['public_id', 'event_picture', 'event_logo', 'title',
                   'description', 'start_date', 'start_time', 'end_date',
                   'end_time', 'venue', 'team_event', 'category', 'tags',
-                  'max_participants', 'reserved_slots']
+                  'max_participants', 'reserved_slots', 'admission_mode']
         depth = 2
 
 
@@ -38,5 +86,5 @@ class TeamEventSerializer(serializers.ModelSerializer):
                   'description', 'start_date', 'start_time', 'end_date',
                   'end_time', 'venue', 'team_event', 'min_team_size',
                   'max_team_size', 'category', 'tags',
-                  'max_participants', 'reserved_slots']
+                  'max_participants', 'reserved_slots', 'admission_mode']
         depth = 2
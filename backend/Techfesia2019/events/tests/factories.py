@@ -0,0 +1,32 @@
+"""
+    Events and seat counters shared by the tests of all apps
+"""
+import datetime
+
+from events.allocation import SEAT_COUNTERS
+from events.models import Event, SoloEvent, TeamEvent
+
+EVENT_DATE = datetime.date(2019, 10, 1)
+
+
+def event_fields(title, date, fields):
+    """
+        Fields of an event held on date from 10:00 to 12:00, overridden by fields
+    """
+    return dict(dict(title=title, start_date=date, start_time=datetime.time(10, 0), end_date=date,
+                     end_time=datetime.time(12, 0)), **fields)
+
+
+def create_solo_event(title='event', date=EVENT_DATE, **fields):
+    return SoloEvent.objects.create(**event_fields(title, date, fields))
+
+
+def create_team_event(title='team event', date=EVENT_DATE, **fields):
+    return TeamEvent.objects.create(**event_fields(title, date, dict(fields, team_event=True)))
+
+
+def seat_counters(event):
+    """
+        Returns the seat counters of event as stored in the database, in the order of SEAT_COUNTERS
+    """
+    return Event.objects.filter(pk=event.pk).values_list(*SEAT_COUNTERS).get()
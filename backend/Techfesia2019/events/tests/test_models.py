@@ -0,0 +1,299 @@
+import datetime
+import random
+from unittest import mock
+
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from event_registrations.models import SoloEventRegistration
+from event_registrations.tests.factories import create_profiles
+from events.allocation import AlreadyRegistered, claim_seat, select_promotions
+from events.models import Category, Event, SoloEvent, Tags
+from events.tests.factories import create_solo_event, seat_counters
+from events.vocabulary import Vocabulary
+
+
+class SeatCounterTestCase(TestCase):
+    """
+        The seat counters of an event must always match its registrations
+    """
+
+    def setUp(self):
+        self.event = create_solo_event(max_participants=3, reserved_slots=1)
+        self.profiles = create_profiles(5)
+
+    def register(self, profile, **fields):
+        return SoloEventRegistration.objects.create(event=self.event, profile=profile, is_confirmed=True, **fields)
+
+    def assertCountersReconciled(self):
+        counters = seat_counters(self.event)
+        Event.objects.filter(pk=self.event.pk).reconcile_seat_counters()
+        self.assertEqual(counters, seat_counters(self.event))
+
+    def test_counters_follow_registration_changes(self):
+        registrations = [self.register(profile, is_reserved=i == 4) for i, profile in enumerate(self.profiles)]
+        self.assertEqual(seat_counters(self.event), (0, 0, 5))
+
+        self.event.refresh_participants()
+        self.assertEqual(seat_counters(self.event), (3, 1, 2))
+        self.assertCountersReconciled()
+
+        registration = SoloEventRegistration.objects.get(pk=registrations[0].pk)
+        registration.delete()
+        self.assertEqual(seat_counters(self.event), (2, 1, 2))
+
+        registration = SoloEventRegistration.objects.only('pk').get(pk=registrations[1].pk)
+        registration.is_complete = False
+        registration.is_confirmed = False
+        registration.save()
+        self.assertEqual(seat_counters(self.event), (1, 1, 2))
+        self.assertCountersReconciled()
+
+    def test_saving_a_stale_event_keeps_counters(self):
+        stale_event = SoloEvent.objects.get(pk=self.event.pk)
+        self.register(self.profiles[0])
+
+        stale_event.venue = 'main hall'
+        stale_event.save()
+        self.assertEqual(seat_counters(self.event), (0, 0, 1))
+        self.assertEqual(Event.objects.get(pk=self.event.pk).venue, 'main hall')
+
+
+class VocabularyTestCase(TestCase):
+    """
+        Names of categories and tags are resolved from memory until a category or tag changes
+    """
+
+    def setUp(self):
+        # the transaction of the test never commits, commit() runs the on_commit callbacks instead
+        self.callbacks = []
+        patcher = mock.patch('django.db.transaction.on_commit', side_effect=self.callbacks.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.music = Category.objects.create(name='music', description='')
+        self.dance = Category.objects.create(name='dance', description='')
+        self.online = Tags.objects.create(name='online', description='')
+        # fresh instances, the shared ones may remember rows of other tests
+        self.categories = Vocabulary(Category)
+        self.tags = Vocabulary(Tags)
+        self.commit()
+
+    def commit(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+    def test_names_are_resolved_from_memory(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.categories.resolve(['music', 'dance']),
+                             ({'music': self.music.id, 'dance': self.dance.id}, []))
+        self.commit()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.categories.resolve(['dance']), ({'dance': self.dance.id}, []))
+        self.assertEqual(self.tags.resolve(['online', 'music']), ({'online': self.online.id}, ['music']))
+
+    def test_unknown_names_cost_one_query(self):
+        self.categories.resolve(['music'])
+        self.commit()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.categories.resolve(['music', 'theatre', 'drama']),
+                             ({'music': self.music.id}, ['theatre', 'drama']))
+
+    def test_changes_reload_the_vocabulary(self):
+        self.categories.resolve(['music'])
+        self.tags.resolve(['online'])
+        self.commit()
+
+        self.music.name = 'concerts'
+        self.music.save()
+        self.commit()
+        self.assertEqual(self.categories.resolve(['music', 'concerts']), ({'concerts': self.music.id}, ['music']))
+
+        theatre = Category.objects.create(name='theatre', description='')
+        self.commit()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.categories.resolve(['theatre']), ({'theatre': theatre.id}, []))
+
+        self.dance.delete()
+        self.commit()
+        self.assertEqual(self.categories.resolve(['dance']), ({}, ['dance']))
+
+        self.online.delete()
+        self.commit()
+        self.assertEqual(self.tags.resolve(['online']), ({}, ['online']))
+
+    def test_rolled_back_rows_are_not_remembered(self):
+        self.categories.resolve(['music'])
+        self.commit()
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                theatre = Category.objects.create(name='theatre', description='')
+                self.assertEqual(self.categories.resolve(['theatre']), ({'theatre': theatre.id}, []))
+                raise DatabaseError
+        # the callbacks of a rolled back transaction are dropped
+        self.callbacks.clear()
+
+        self.assertEqual(self.categories.resolve(['theatre']), ({}, ['theatre']))
+
+    def test_clear(self):
+        self.categories.resolve(['music'])
+        self.commit()
+        self.categories.clear()
+        with self.assertNumQueries(1):
+            self.categories.resolve(['music'])
+
+
+def refresh_participants_loop(total_seats, total_reserved_seats, registrations):
+    """
+        The refresh_participants loop replaced by events.allocation, over a list of
+        [id, is_reserved, is_complete] registrations, oldest first. Returns the promoted ids in order
+    """
+    promoted = list()
+
+    def promote(candidates):
+        registration = candidates[0]
+        registration[2] = True
+        promoted.append(registration[0])
+
+    def participants(is_reserved=None):
+        return [r for r in registrations if r[2] and is_reserved in (None, r[1])]
+
+    def waiting(reserved_only=False):
+        return [r for r in registrations if not r[2] and (r[1] or not reserved_only)]
+
+    while waiting(reserved_only=True):
+        if len(participants(is_reserved=True)) < total_reserved_seats:
+            promote(waiting(reserved_only=True))
+        else:
+            break
+    if len(participants(is_reserved=True)) >= total_reserved_seats:
+        while waiting():
+            if len(participants()) < total_seats:
+                promote(waiting())
+            else:
+                break
+    else:
+        while waiting():
+            if len(participants(is_reserved=False)) < total_seats - total_reserved_seats:
+                promote(waiting())
+            else:
+                break
+    return promoted
+
+
+class SelectPromotionsTestCase(SimpleTestCase):
+    """
+        select_promotions gives the seats in the order the refresh_participants loop did
+    """
+
+    def promotions(self, total_seats, reserved_seats, registrations):
+        participants = [r for r in registrations if r[2]]
+        waiting = [(r[0], r[1]) for r in registrations if not r[2]]
+        return select_promotions(total_seats, reserved_seats, len(participants),
+                                 len([r for r in participants if r[1]]), waiting)
+
+    def test_reserved_registrations_take_the_reserved_seats_first(self):
+        # ids in created_on order: 1 general, 2 reserved, 3 general, 4 reserved
+        waiting = [[1, False, False], [2, True, False], [3, False, False], [4, True, False]]
+        self.assertEqual(self.promotions(3, 1, waiting), [2, 1, 3])
+        self.assertEqual(self.promotions(3, 2, waiting), [2, 4, 1])
+
+    def test_free_reserved_seats_are_kept_for_reserved_registrations(self):
+        waiting = [[1, False, False], [2, False, False], [3, False, False]]
+        self.assertEqual(self.promotions(3, 1, waiting), [1, 2])
+        self.assertEqual(self.promotions(3, 0, waiting), [1, 2, 3])
+
+    def test_full_event_promotes_nobody(self):
+        registrations = [[1, True, True], [2, False, True], [3, False, False], [4, True, False]]
+        self.assertEqual(self.promotions(2, 1, registrations), [])
+
+    def test_matches_the_refresh_participants_loop(self):
+        rng = random.Random(2019)
+        for _ in range(2000):
+            total_seats = rng.randint(0, 6)
+            reserved_seats = rng.randint(0, total_seats)
+            registrations = [[pk, rng.random() < 0.4, rng.random() < 0.3] for pk in range(rng.randint(0, 10))]
+            expected = refresh_participants_loop(total_seats, reserved_seats, [list(r) for r in registrations])
+            self.assertEqual(self.promotions(total_seats, reserved_seats, registrations), expected,
+                             (total_seats, reserved_seats, registrations))
+
+
+class AllocationOrderTestCase(TestCase):
+    """
+        Waiting registrations are served in created_on order, not in insertion order
+    """
+
+    def test_oldest_waiting_registrations_get_the_seats(self):
+        event = create_solo_event(max_participants=3, reserved_slots=1)
+        now = timezone.now()
+        registrations = list()
+        # inserted newest first
+        for i, (profile, is_reserved) in enumerate(zip(create_profiles(5), [False, True, False, True, False])):
+            registration = SoloEventRegistration.objects.create(event=event, profile=profile, is_confirmed=True,
+                                                                is_reserved=is_reserved)
+            SoloEventRegistration.objects.filter(pk=registration.pk) \
+                .update(created_on=now - datetime.timedelta(minutes=i))
+            registrations.append(registration.pk)
+
+        event.refresh_participants()
+
+        # the oldest reserved one takes the reserved seat, the two oldest others the general seats
+        self.assertEqual(set(event.current_participants().values_list('pk', flat=True)),
+                         {registrations[3], registrations[4], registrations[2]})
+        self.assertEqual(list(event.current_waiting_participants().order_by('created_on')
+                              .values_list('pk', flat=True)), [registrations[1], registrations[0]])
+
+
+class SeatClaimTestCase(TestCase):
+    """
+        claim_seat never gives more seats than the event has, and reads the seats only once the event is locked
+    """
+
+    def setUp(self):
+        self.event = create_solo_event(max_participants=2)
+        self.profiles = create_profiles(4)
+
+    def test_claims_stop_at_capacity(self):
+        # every claim uses the same copy of the event, loaded before any seat was taken
+        claimed = [claim_seat(self.event, SoloEventRegistration(profile=profile)) for profile in self.profiles]
+
+        self.assertEqual(claimed, [True, True, False, False])
+        self.assertEqual(self.event.current_participants().count(), 2)
+        self.assertEqual(seat_counters(self.event), (2, 0, 2))
+
+    def test_second_claim_of_a_profile_is_refused(self):
+        claim_seat(self.event, SoloEventRegistration(profile=self.profiles[0]))
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(AlreadyRegistered):
+                claim_seat(self.event, SoloEventRegistration(profile=self.profiles[0]))
+        statements = [query['sql'] for query in queries
+                      if not query['sql'].startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK'))]
+
+        # the existing registration is looked up under the lock
+        lock = next(i for i, sql in enumerate(statements)
+                    if sql.startswith('UPDATE "events_event"') or sql.endswith('FOR UPDATE'))
+        self.assertIn('FROM "event_registrations_soloeventregistration"', statements[-1])
+        self.assertLess(lock, len(statements) - 1)
+        self.assertFalse([sql for sql in statements if sql.startswith('INSERT')])
+        self.assertEqual(self.event.soloeventregistration_set.count(), 1)
+        self.assertEqual(seat_counters(self.event), (1, 0, 0))
+
+    def test_event_is_locked_before_seats_are_read(self):
+        claim_seat(self.event, SoloEventRegistration(profile=self.profiles[0]))
+        with CaptureQueriesContext(connection) as queries:
+            claim_seat(self.event, SoloEventRegistration(profile=self.profiles[1]))
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+        if connection.features.has_select_for_update:
+            lock = next(i for i, sql in enumerate(statements) if sql.endswith('FOR UPDATE'))
+        else:
+            lock = next(i for i, sql in enumerate(statements)
+                        if sql.startswith('UPDATE "events_event" SET "max_participants" = "events_event"."max_participants"'))
+        insert = next(i for i, sql in enumerate(statements)
+                      if sql.startswith('INSERT INTO "event_registrations_soloeventregistration"'))
+        seats = next(i for i, sql in enumerate(statements) if '"participants_count"' in sql)
+        self.assertLessEqual(lock, seats)
+        self.assertLess(seats, insert)
@@ -0,0 +1,390 @@
+import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from event_registrations.models import SoloEventRegistration, Team, TeamEventRegistration
+from event_registrations.tests.factories import create_profile, create_profiles
+from events.allocation import claim_seat
+from events.models import Category, Event, Tags, SoloEvent, TeamEvent, event_resolver
+from events.tests.factories import create_solo_event, create_team_event, seat_counters
+from events.utils import get_catalog_version
+from registration.models import User
+
+
+class EventListQueryCountTestCase(APITestCase):
+    """
+        Listing events must cost the same number of queries no matter how many events exist
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.categories = [Category.objects.create(name=f'category {i}') for i in range(3)]
+        self.tags = [Tags.objects.create(name=f'tag {i}') for i in range(3)]
+        self.event_count = 0
+
+    def create_events(self, count):
+        for _ in range(count):
+            self.event_count += 1
+            title = f'event {self.event_count}'
+            if self.event_count % 2:
+                event = create_solo_event(title)
+            else:
+                event = create_team_event(title, min_team_size=2, max_team_size=4)
+            event.category.set(self.categories)
+            event.tags.set(self.tags)
+
+    def list_events(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('events_list_create'), {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_listing_query_count_is_constant(self):
+        self.create_events(2)
+        response, small_catalog_queries = self.list_events()
+        self.assertEqual(len(response.data['events']), 2)
+
+        self.create_events(30)
+        response, large_catalog_queries = self.list_events()
+        self.assertEqual(len(response.data['events']), 32)
+
+        self.assertEqual(small_catalog_queries, large_catalog_queries)
+
+    def test_listing_serializes_both_event_types(self):
+        self.create_events(2)
+        response, _ = self.list_events()
+        solo_event, team_event = response.data['events']
+
+        self.assertNotIn('min_team_size', solo_event)
+        self.assertEqual(team_event['min_team_size'], 2)
+        self.assertEqual(team_event['max_team_size'], 4)
+        self.assertEqual(sorted(tag['name'] for tag in team_event['tags']), ['tag 0', 'tag 1', 'tag 2'])
+
+    def test_listing_has_the_shape_of_the_detail(self):
+        self.create_events(2)
+        response, _ = self.list_events()
+        for event in response.data['events']:
+            detail = self.client.get(reverse('events_delete', args=[event['public_id']])).data
+            self.assertEqual(event, detail)
+
+    def test_listing_is_paginated_by_cursor(self):
+        self.create_events(5)
+        seen = list()
+        cursor = None
+        while True:
+            params = {'page_size': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(reverse('events_list_create'), params)
+            self.assertLessEqual(len(response.data['events']), 2)
+            seen += [event['title'] for event in response.data['events']]
+            cursor = response.data['next']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, [f'event {i}' for i in range(1, 6)])
+
+
+class EventFilterTestCase(APITestCase):
+    """
+        Filters of the events list: several categories or tags match any of them, from and to bound the start date
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        self.music, self.dance, self.code = [Category.objects.create(name=name) for name in ('music', 'dance', 'code')]
+        self.online, self.prize = [Tags.objects.create(name=name) for name in ('online', 'prize')]
+        self.concert = self.create_event('concert', datetime.date(2019, 10, 1), [self.music], [self.prize])
+        self.ballet = self.create_event('ballet', datetime.date(2019, 10, 2), [self.dance], [self.online, self.prize])
+        self.contest = self.create_event('contest', datetime.date(2019, 10, 3), [self.code, self.music], [self.online])
+
+    def create_event(self, title, start_date, categories, tags):
+        event = create_solo_event(title, start_date)
+        event.category.set(categories)
+        event.tags.set(tags)
+        return event
+
+    def titles(self, **params):
+        response = self.client.get(reverse('events_list_create'), params)
+        self.assertEqual(response.status_code, 200)
+        return [event['title'] for event in response.data['events']]
+
+    def test_several_categories_match_any_of_them(self):
+        self.assertEqual(self.titles(category='music'), ['concert', 'contest'])
+        self.assertEqual(self.titles(category='dance,code'), ['ballet', 'contest'])
+        # an event in two of the categories is listed once
+        self.assertEqual(self.titles(category='music,code'), ['concert', 'contest'])
+
+    def test_several_tags_match_any_of_them(self):
+        self.assertEqual(self.titles(tags='online'), ['ballet', 'contest'])
+        self.assertEqual(self.titles(tags='online,prize'), ['concert', 'ballet', 'contest'])
+
+    def test_categories_and_tags_are_combined(self):
+        self.assertEqual(self.titles(category='music', tags='prize'), ['concert'])
+
+    def test_date_range(self):
+        self.assertEqual(self.titles(**{'from': '2019-10-02'}), ['ballet', 'contest'])
+        self.assertEqual(self.titles(to='2019-10-02'), ['concert', 'ballet'])
+        self.assertEqual(self.titles(**{'from': '2019-10-02', 'to': '2019-10-02'}), ['ballet'])
+        self.assertEqual(self.titles(**{'from': '2019-10-03', 'to': '2019-10-01'}), [])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'category': 'music,theatre'}, {'tags': 'offline'}, {'from': '01-10-2019'},
+                       {'to': '2019-13-01'}, {'team_event': 'yes'}):
+            response = self.client.get(reverse('events_list_create'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
+
+
+class EventStatsTestCase(APITestCase):
+    """
+        The stats dashboard costs one query per registration change, however many events and viewers there are
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        self.events = [create_solo_event(f'event {i}', start_time=datetime.time(10, i), max_participants=1)
+                       for i in range(3)]
+        self.profiles = create_profiles(2)
+
+    def stats(self):
+        response = self.client.get(reverse('events_stats'))
+        self.assertEqual(response.status_code, 200)
+        return [(event['participants_count'], event['waiting_participants_count']) for event in response.data['events']]
+
+    def test_stats_are_cached_until_a_registration_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.stats(), [(0, 0)] * 3)
+        with self.assertNumQueries(0):
+            self.stats()
+
+        for profile in self.profiles:
+            claim_seat(self.events[1], SoloEventRegistration(profile=profile))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.stats(), [(0, 0), (1, 1), (0, 0)])
+
+    def test_stats_are_for_staff(self):
+        self.client.force_authenticate(self.profiles[0].user)
+        self.assertEqual(self.client.get(reverse('events_stats')).status_code, 403)
+
+
+class CatalogCacheTestCase(APITestCase):
+    """
+        Catalog responses are served from the cache with an ETag until an event, category or tag changes
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        self.tag = Tags.objects.create(name='tag')
+        self.event = create_solo_event()
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('events_list_create'), **headers)
+
+    def assertChanged(self, etag):
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_matching_etag_gets_not_modified_without_queries(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(response['ETag']).status_code, 304)
+            self.assertEqual(self.get().data, response.data)
+
+    def test_changes_invalidate_the_catalog(self):
+        etag = self.get()['ETag']
+
+        self.event.venue = 'main hall'
+        self.event.save()
+        etag = self.assertChanged(etag)
+        self.assertEqual(self.get().data['events'][0]['venue'], 'main hall')
+
+        self.event.tags.set([self.tag])
+        etag = self.assertChanged(etag)
+        self.assertEqual(self.get().data['events'][0]['tags'][0]['name'], 'tag')
+
+        self.tag.description = 'new description'
+        self.tag.save()
+        etag = self.assertChanged(etag)
+
+        self.event.delete()
+        self.assertChanged(etag)
+        self.assertEqual(self.get().data['events'], [])
+
+    def test_catalog_is_invalidated_again_on_commit(self):
+        # a request served before the commit may have cached the old catalog under the new version
+        with mock.patch('events.utils.transaction.on_commit') as on_commit:
+            self.event.save()
+        version = get_catalog_version()
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class EventSearchTestCase(APITestCase):
+    """
+        ?q= ranks the events by relevance, reads one page of the search index per request
+        and follows the events as they are saved and deleted
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+
+    def create_event(self, title, description=''):
+        return create_solo_event(title, description=description)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('events_list_create'), dict(params, q=q))
+        self.assertEqual(response.status_code, 200)
+        return [event['title'] for event in response.data['events']], response.data['next']
+
+    def test_search_ranks_matches(self):
+        self.create_event('quiz night')
+        self.create_event('robotics', 'a robot race')
+        self.create_event('robot wars', 'robot against robot')
+
+        titles, next_cursor = self.search('robot')
+        self.assertEqual(titles, ['robot wars', 'robotics'])
+        self.assertIsNone(next_cursor)
+        self.assertEqual(self.search('robot quiz')[0], [])
+
+    def test_search_is_paginated_by_rank(self):
+        for i in range(7):
+            self.create_event(f'coding {i}', 'coding ' * i)
+        everything = self.search('coding', page_size=100)[0]
+
+        seen = list()
+        titles, cursor = self.search('coding', page_size=3)
+        seen += titles
+        while cursor:
+            with CaptureQueriesContext(connection) as queries:
+                titles, cursor = self.search('coding', page_size=3, cursor=cursor)
+            seen += titles
+            page_queries = [query['sql'] for query in queries if 'events_event_search' in query['sql']]
+            self.assertEqual(len(page_queries), 1)
+            self.assertIn('LIMIT 4', page_queries[0])
+
+        self.assertEqual(seen, everything)
+        self.assertEqual(sorted(seen), [f'coding {i}' for i in range(7)])
+
+    def test_search_index_follows_saves_and_deletes(self):
+        event = self.create_event('hackathon')
+        self.assertEqual(self.search('hackathon')[0], ['hackathon'])
+
+        event.title = 'codeathon'
+        event.save()
+        self.assertEqual(self.search('hackathon')[0], [])
+        self.assertEqual(self.search('codeathon')[0], ['codeathon'])
+
+        event.delete()
+        self.assertEqual(self.search('codeathon')[0], [])
+
+    def test_query_without_words_finds_nothing(self):
+        self.create_event('robotics')
+        for q in ('!!', '-', '"*'):
+            self.assertEqual(self.search(q), ([], None))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('events_list_create'), {'q': 'robot', 'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EventConversionTestCase(APITestCase):
+    """
+        Changing team_event converts the event in place, unless it has registrations that would be left behind
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        self.solo_event = create_solo_event('solo', max_participants=2)
+        self.team_event = create_team_event('team', min_team_size=2, max_team_size=4, max_participants=2)
+        self.profile = create_profile('player')
+
+    def put(self, event, team_event, **fields):
+        data = dict(event_picture=None, event_logo=None, title=event.title, description='', start_date='2019-10-01',
+                    start_time='10:00', end_date='2019-10-01', end_time='12:00', venue='main hall',
+                    team_event=team_event, max_participants=2, reserved_slots=0, min_team_size=2, max_team_size=3,
+                    **fields)
+        return self.client.put(reverse('events_delete', args=[event.public_id]), data, format='json')
+
+    def test_solo_event_becomes_team_event(self):
+        response = self.put(self.solo_event, True)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['public_id'], self.solo_event.public_id)
+
+        event = TeamEvent.objects.get(pk=self.solo_event.pk)
+        self.assertEqual((event.public_id, event.max_team_size, event.venue),
+                         (self.solo_event.public_id, 3, 'main hall'))
+        self.assertFalse(SoloEvent.objects.filter(pk=self.solo_event.pk).exists())
+        self.assertEqual(seat_counters(event), (0, 0, 0))
+
+    def test_team_event_becomes_solo_event(self):
+        response = self.put(self.team_event, False)
+        self.assertEqual(response.status_code, 202)
+
+        event = SoloEvent.objects.get(pk=self.team_event.pk)
+        self.assertEqual(event.public_id, self.team_event.public_id)
+        self.assertFalse(TeamEvent.objects.filter(pk=self.team_event.pk).exists())
+        self.assertEqual(seat_counters(event), (0, 0, 0))
+
+    def test_solo_event_with_registrations_is_not_converted(self):
+        registration = SoloEventRegistration.objects.create(event=self.solo_event, profile=self.profile,
+                                                            is_confirmed=True, is_complete=True)
+
+        response = self.put(self.solo_event, True)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['registrations'], [registration.public_id])
+        self.assertIsInstance(event_resolver.resolve(self.solo_event.public_id), SoloEvent)
+        self.assertFalse(TeamEvent.objects.filter(pk=self.solo_event.pk).exists())
+        self.assertEqual(list(self.solo_event.current_participants()), [registration])
+        self.assertEqual(seat_counters(self.solo_event), (1, 0, 0))
+
+    def test_team_event_with_registrations_is_not_converted(self):
+        team = Team.objects.create(name='team', team_leader=self.profile)
+        registration = TeamEventRegistration.objects.create(event=self.team_event, team=team, is_confirmed=True)
+
+        response = self.put(self.team_event, False)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['registrations'], [registration.public_id])
+        self.assertIsInstance(event_resolver.resolve(self.team_event.public_id), TeamEvent)
+        self.assertEqual(list(self.team_event.current_waiting_participants()), [registration])
+        self.assertEqual(seat_counters(self.team_event), (0, 0, 1))
+
+    def test_admission_mode_is_kept_or_changed(self):
+        Event.objects.filter(pk=self.solo_event.pk).update(admission_mode=Event.QUEUED_ADMISSION)
+        self.assertEqual(self.put(self.solo_event, True).status_code, 202)
+        self.assertEqual(TeamEvent.objects.get(pk=self.solo_event.pk).admission_mode, Event.QUEUED_ADMISSION)
+
+        self.assertEqual(self.put(self.team_event, False, admission_mode=Event.QUEUED_ADMISSION).status_code, 202)
+        self.assertEqual(SoloEvent.objects.get(pk=self.team_event.pk).admission_mode, Event.QUEUED_ADMISSION)
+
+    def test_admission_mode_is_set_on_creation(self):
+        data = dict(event_picture=None, event_logo=None, title='new', description='', start_date='2019-10-01',
+                    start_time='10:00', end_date='2019-10-01', end_time='12:00', venue='main hall',
+                    team_event=False, max_participants=2, reserved_slots=0)
+
+        response = self.client.post(reverse('events_list_create'), dict(data, admission_mode=Event.QUEUED_ADMISSION),
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['admission_mode'], Event.QUEUED_ADMISSION)
+        self.assertEqual(SoloEvent.objects.get(title='new').admission_mode, Event.QUEUED_ADMISSION)
+
+        response = self.client.post(reverse('events_list_create'),
+                                    dict(data, title='new team', team_event=True, min_team_size=2, max_team_size=3),
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(TeamEvent.objects.get(title='new team').admission_mode, Event.DIRECT_ADMISSION)
+
+        response = self.client.post(reverse('events_list_create'), dict(data, title='other', admission_mode='lottery'),
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import TagsListCreateView, TagsEditDeleteView, CategoryListCreateView, \
-    CategoryEditDeleteView, EventListCreateView, EventDetailEditDeleteView
+    CategoryEditDeleteView, EventListCreateView, EventDetailEditDeleteView, EventStatsView
 
 urlpatterns = [
     path('', EventListCreateView.as_view(), name='events_list_create'),
@@ -8,5 +8,6 @@ urlpatterns = [
     path('/tags/<str:name>', TagsEditDeleteView.as_view(), name='tags_edit_delete'),
     path('/category', CategoryListCreateView.as_view(), name='category_list_create'),
     path('/category/<str:name>', CategoryEditDeleteView.as_view(), name='category_edit_delete'),
+    path('/stats', EventStatsView.as_view(), name='events_stats'),
     path('/<str:public_id>', EventDetailEditDeleteView.as_view(), name='events_delete'),
 ]
@@ -0,0 +1,114 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'events:catalog:version'
+REGISTRATIONS_VERSION_KEY = 'events:registrations:version'
+
+
+def get_cache_version(key):
+    """
+        Returns the version stored in the cache under key, creating one if needed.
+        Anything cached against a version is invalidated at once by bumping the version
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_cache_version(key):
+    # A random version is used instead of a counter so that an evicted version can never be reused
+    cache.set(key, uuid.uuid4().hex, timeout=None)
+
+
+def bump_cache_version_now_and_on_commit(*keys):
+    """
+        Bumps the versions under keys for the current connection, and again once the change is visible
+        to other connections, which may have cached the old state meanwhile
+    """
+    def bump():
+        for key in keys:
+            bump_cache_version(key)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def vocabulary_version_key(model):
+    return f'events:vocabulary:{model._meta.model_name}:version'
+
+
+def registrations_version_key(event_id):
+    return f'events:{event_id}:registrations:version'
+
+
+def bump_registrations_version(event_id):
+    """
+        Call this whenever a registration of the event is created, deleted or changes its seat state.
+        Bumps the version of the event and the version of the registrations of all events
+    """
+    bump_cache_version_now_and_on_commit(registrations_version_key(event_id), REGISTRATIONS_VERSION_KEY)
+
+
+def get_catalog_version():
+    """
+        Returns the current version of the public event catalog.
+        All cached catalog responses are keyed on this version
+    """
+    return get_cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+        Call this whenever an event, category or tag changes.
+    """
+    bump_cache_version_now_and_on_commit(CATALOG_VERSION_KEY)
+
+
+def cached_catalog_response(request, build_response):
+    """
+        Serves a GET on the public catalog from the cache.
+        build_response is called only on a cache miss and only successful responses are cached.
+        The strong ETag depends only on the catalog version and the requested url,
+        so a matching If-None-Match gets a 304 without touching the database
+    """
+    version = get_catalog_version()
+    digest = hashlib.sha1(f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+    etag = quote_etag(digest)
+
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    cache_key = f'events:catalog:response:{digest}'
+    data = cache.get(cache_key)
+    if data is None:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        data = response.data
+        cache.set(cache_key, data, settings.EVENTS_CATALOG_CACHE_TIMEOUT)
+
+    return Response(data, status=status.HTTP_200_OK, headers={'ETag': etag})
+
+
+def cached_event_stats(build_stats):
+    """
+        Returns the seat stats of all events, from the cache while no event and no registration changed.
+        build_stats is called on a cache miss, its result is cached for settings.EVENTS_STATS_CACHE_TIMEOUT seconds
+    """
+    cache_key = f'events:stats:{get_catalog_version()}:{get_cache_version(REGISTRATIONS_VERSION_KEY)}'
+    stats = cache.get(cache_key)
+    if stats is None:
+        stats = build_stats()
+        cache.set(cache_key, stats, settings.EVENTS_STATS_CACHE_TIMEOUT)
+
+    return stats
@@ -1,14 +1,31 @@
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from rest_framework import status
 from rest_framework.parsers import JSONParser, FileUploadParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Tags, Category, SoloEvent, TeamEvent
+from .models import Tags, Category, Event, EventHasRegistrations, SoloEvent, TeamEvent, event_resolver
+from .pagination import decode_rank_cursor, get_page_size, paginate_events, paginate_ranked_events
+from .search import search_events
 from .permissions import IsStaffUser
-from .serializers import TagsSerializer, CategorySerializer, SoloEventSerializer, TeamEventSerializer
+from .serializers import TagsSerializer, CategorySerializer, EventSerializer, SoloEventSerializer, \
+    TeamEventSerializer
+from .utils import cached_catalog_response, cached_event_stats
+from . import vocabulary
 import datetime
 
+# fields common to solo and team events that are updated from request data
+EVENT_FIELDS = ('event_picture', 'event_logo', 'title', 'description', 'start_time', 'start_date',
+                'end_date', 'end_time', 'venue', 'team_event', 'max_participants', 'reserved_slots', 'admission_mode')
+# fields of EVENT_FIELDS that requests may leave out, events keep their value then
+OPTIONAL_EVENT_FIELDS = ('admission_mode',)
+
+
+def set_event_fields(event, data):
+    for field in EVENT_FIELDS:
+        if field in data or field not in OPTIONAL_EVENT_FIELDS:
+            setattr(event, field, data[field])
+
 
 def validation_errors(data):
 
@@ -49,48 +66,32 @@ def validation_errors(data):
         return [1, Response({'error': 'reserved_slots cannot be greater than max_participants'},
                             status=status.HTTP_422_UNPROCESSABLE_ENTITY)]
 
-    # 5. Validating list of categories and tags
+    # 5. Checking admission_mode, optional
+    if data.get('admission_mode', Event.DIRECT_ADMISSION) not in dict(Event.ADMISSION_MODES):
+        return [1, Response({'error': f'admission_mode should be one of {", ".join(dict(Event.ADMISSION_MODES))}'},
+                            status=status.HTTP_400_BAD_REQUEST)]
+
+    # 6. Validating list of categories and tags
+    # names are resolved to ids from the cached vocabularies, unknown names cost a single query
     category_list = list()
     has_tags = 0
     tags_list = list()
     if 'category' in data:
-        invalid_category_list = list()
-        for name in data['category']:
-            try:
-                category_list.append(Category.objects.get(name=name))
-            except Category.DoesNotExist:
-                invalid_category_list.append(name)
+        category_ids, invalid_category_list = vocabulary.categories.resolve(data['category'])
         if len(invalid_category_list) > 0:
             return [1, Response({'error': f'The following categories {invalid_category_list} do not exist.'},
                                 status=status.HTTP_422_UNPROCESSABLE_ENTITY)]
-        if len(category_list) == 0:
-            try:
-                category_list.append(Category.objects.get(name='Others'))
-            except Category.DoesNotExist:
-                c = Category(name='Others',
-                             description='It is a default category for events')
-                c.save()
-                category_list.append(Category.objects.get(name='Others'))
-    else:
-        try:
-            category_list.append(Category.objects.get(name='Others'))
-        except Category.DoesNotExist:
-            c = Category(name='Others',
-                         description='It is a default category for events')
-            c.save()
-            category_list.append(Category.objects.get(name='Others'))
+        category_list = list(category_ids.values())
+    if len(category_list) == 0:
+        category_list.append(vocabulary.default_category_id())
 
     if 'tags' in data:
         has_tags = 1
-        invalid_tags_list = list()
-        for name in data['tags']:
-            try:
-                tags_list.append(Tags.objects.get(name=name))
-            except Tags.DoesNotExist:
-                invalid_tags_list.append(name)
+        tags_ids, invalid_tags_list = vocabulary.tags.resolve(data['tags'])
         if len(invalid_tags_list) > 0:
             return [1, Response({'error': f'The following tags {invalid_tags_list} do not exist.'},
                                 status=status.HTTP_422_UNPROCESSABLE_ENTITY)]
+        tags_list = list(tags_ids.values())
 
     if has_tags == 0:
         return [2, category_list]
@@ -98,10 +99,52 @@ def validation_errors(data):
         return [3, category_list, tags_list]
 
 
+def filter_events(events, query_params):
+    """
+        Applies the ?category=a,b&tags=x,y&from=YYYY-MM-DD&to=YYYY-MM-DD&team_event=true filters.
+        Several names for category or tags match events having any of them.
+        Filters are applied as subqueries on the through tables, so the listing stays a single query.
+        Returns the filtered events and an error response (None if filters are valid)
+    """
+
+    for taxonomy, param in ((vocabulary.categories, 'category'), (vocabulary.tags, 'tags')):
+        if not query_params.get(param):
+            continue
+        ids, invalid_names = taxonomy.resolve(set(query_params[param].split(',')))
+        if invalid_names:
+            return events, Response({'error': f'Invalid filtering against non existing {param} '
+                                              f'{sorted(invalid_names)}'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+        through = getattr(Event, param).through
+        model_name = taxonomy.model._meta.model_name
+        events = events.filter(id__in=through.objects.filter(**{f'{model_name}_id__in': ids.values()})
+                               .values('event_id'))
+
+    for param, lookup in (('from', 'start_date__gte'), ('to', 'start_date__lte')):
+        if param in query_params:
+            try:
+                date = datetime.datetime.strptime(query_params[param], '%Y-%m-%d').date()
+            except ValueError:
+                return events, Response({'error': f'Incorrect {param} format, should be "YYYY-MM-DD"'},
+                                        status=status.HTTP_400_BAD_REQUEST)
+            events = events.filter(**{lookup: date})
+
+    if 'team_event' in query_params:
+        if query_params['team_event'] not in ('true', 'false'):
+            return events, Response({'error': 'team_event should be either true or false'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+        events = events.filter(team_event=query_params['team_event'] == 'true')
+
+    return events, None
+
+
 class TagsListCreateView(APIView):
     permission_classes = (IsStaffUser,)
 
     def get(self, request, format=None):
+        return cached_catalog_response(request, self.list_tags)
+
+    def list_tags(self):
         tags = Tags.objects.all()
         serializer = TagsSerializer(tags, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -145,6 +188,9 @@ class CategoryListCreateView(APIView):
     permission_classes = (IsStaffUser,)
 
     def get(self, request, format=None):
+        return cached_catalog_response(request, self.list_categories)
+
+    def list_categories(self):
         category = Category.objects.all()
         serializer = CategorySerializer(category, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -190,39 +236,36 @@ class EventListCreateView(APIView):
     permission_classes = (IsAuthenticated, IsStaffUser, )
 
     def get(self, request, format=None):
-        solo_events = SoloEvent.objects.all()
-        team_events = TeamEvent.objects.all()
+        return cached_catalog_response(request, lambda: self.list_events(request))
 
-        # implementing filtering
-        if 'category' in request.query_params:
-            try:
-                category = Category.objects.get(name=request.query_params['category'])
-            except Category.DoesNotExist:
-                return Response({'error': 'Invalid filtering against non existing category'},
-                                status=status.HTTP_400_BAD_REQUEST)
-            if 'tags' in request.query_params:
-                try:
-                    tag = Tags.objects.get(name=request.query_params['tags'])
-                except Tags.DoesNotExist:
-                    return Response({'error': 'Invalid filtering against non existing tags'},
-                                    status=status.HTTP_400_BAD_REQUEST)
-                solo_events = SoloEvent.objects.filter(category=category, tags=tag)
-                team_events = TeamEvent.objects.filter(category=category, tags=tag)
+    def list_events(self, request):
+        # both kinds of events are fetched from the Event base table in one joined query
+        events = Event.objects.with_details()
+
+        try:
+            page_size = get_page_size(request)
+        except ValueError:
+            return Response({'error': 'page_size should be a positive integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        events, error = filter_events(events, request.query_params)
+        if error:
+            return error
+
+        try:
+            if request.query_params.get('q'):
+                # results are ranked by relevance by the full text search index
+                cursor = request.query_params.get('cursor')
+                events = search_events(events, request.query_params['q'],
+                                       after=decode_rank_cursor(cursor) if cursor else None)
+                events, next_cursor = paginate_ranked_events(events, page_size)
             else:
-                solo_events = SoloEvent.objects.filter(category=category)
-                team_events = TeamEvent.objects.filter(category=category)
-        elif 'tags' in request.query_params:
-            try:
-                tag = Tags.objects.get(name=request.query_params['tags'])
-            except Tags.DoesNotExist:
-                return Response({'error': 'Invalid filtering against non existing tags'},
-                                status=status.HTTP_400_BAD_REQUEST)
-            solo_events = SoloEvent.objects.filter(tags=tag)
-            team_events = TeamEvent.objects.filter(tags=tag)
-
-        solo_events_serializer = SoloEventSerializer(solo_events, many=True)
-        team_events_serializer = TeamEventSerializer(team_events, many=True)
-        return Response({'events': solo_events_serializer.data + team_events_serializer.data},
+                events, next_cursor = paginate_events(events, request.query_params.get('cursor'), page_size)
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        events_serializer = EventSerializer(events, many=True)
+        return Response({'events': events_serializer.data, 'next': next_cursor},
                         status=status.HTTP_200_OK)
 
     def post(self, request, format=None):
@@ -243,17 +286,14 @@ class EventListCreateView(APIView):
         no_solo_team_event = 0
         # Checking if public_id is provided, then unique.
         if 'public_id' in data:
-            try:
-                SoloEvent.objects.get(public_id=data['public_id'])
+            event = event_resolver.resolve(data['public_id'])
+            if isinstance(event, SoloEvent):
                 return Response({'error': 'Solo event with such public_id already exists'},
                                 status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            except SoloEvent.DoesNotExist:
-                try:
-                    TeamEvent.objects.get(public_id=data['public_id'])
-                    return Response({'error': 'Team event with such public_id already exists'},
-                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-                except TeamEvent.DoesNotExist:
-                    no_solo_team_event = 1
+            elif event is not None:
+                return Response({'error': 'Team event with such public_id already exists'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            no_solo_team_event = 1
 
         # checking if it is a team_event
         if data['team_event']:
@@ -274,7 +314,8 @@ class EventListCreateView(APIView):
                                                team_event=data['team_event'], min_team_size=data['min_team_size'],
                                                max_team_size=data['max_team_size'],
                                                max_participants=data['max_participants'],
-                                               reserved_slots=data['reserved_slots'])
+                                               reserved_slots=data['reserved_slots'],
+                                               admission_mode=data.get('admission_mode', Event.DIRECT_ADMISSION))
                         if no_solo_team_event == 1:
                             team_event.public_id = data['public_id']
                         team_event.save()
@@ -304,7 +345,8 @@ class EventListCreateView(APIView):
                                            end_date=data['end_date'], end_time=data['end_time'], venue=data['venue'],
                                            team_event=data['team_event'],
                                            max_participants=data['max_participants'],
-                                           reserved_slots=data['reserved_slots'])
+                                           reserved_slots=data['reserved_slots'],
+                                           admission_mode=data.get('admission_mode', Event.DIRECT_ADMISSION))
                     if no_solo_team_event == 1:
                         solo_event.public_id = data['public_id']
                     solo_event.save()
@@ -323,39 +365,47 @@ class EventDetailEditDeleteView(APIView):
     permission_classes = (IsStaffUser, )
 
     def get(self, request, public_id, format=None):
-        try:
-            solo_event = SoloEvent.objects.get(public_id=public_id)
-            solo_event_serializer = SoloEventSerializer(solo_event)
-        except SoloEvent.DoesNotExist:
-            try:
-                team_event = TeamEvent.objects.get(public_id=public_id)
-                team_event_serializer = TeamEventSerializer(team_event)
-            except TeamEvent.DoesNotExist:
-                return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            return Response(team_event_serializer.data, status=status.HTTP_200_OK)
-        return Response(solo_event_serializer.data, status=status.HTTP_200_OK)
+        return cached_catalog_response(request, lambda: self.retrieve_event(public_id))
+
+    def retrieve_event(self, public_id):
+        event = event_resolver.resolve(public_id)
+        if event is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        if isinstance(event, SoloEvent):
+            return Response(SoloEventSerializer(event).data, status=status.HTTP_200_OK)
+        return Response(TeamEventSerializer(event).data, status=status.HTTP_200_OK)
 
     def put(self, request, public_id, format=None):
-        try:
-            solo_event = SoloEvent.objects.get(public_id=public_id)
-            data = JSONParser().parse(request)
-            if 'public_id' in data:
-                if public_id != data['public_id']:
-                    return Response({'error': 'public_id of an event can not be changed'},
-                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        """
+            Changing team_event converts the event in place, keeping its public_id.
+            Registrations and pending admission tickets are not converted, events having any are answered
+            with 409 and the public_ids of the blocking registrations and tickets
+        """
+        event = event_resolver.resolve(public_id)
+        if event is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-            error_list = validation_errors(data)
-            has_tags = 0
-            tags_list = list()
-            if error_list[0] == 1:
-                return error_list[1]
-            elif error_list[0] == 2:
-                category_list = error_list[1]
-            else:
-                category_list = error_list[1]
-                tags_list = error_list[2]
-                has_tags = 1
+        data = JSONParser().parse(request)
+        if 'public_id' in data:
+            if public_id != data['public_id']:
+                return Response({'error': 'public_id of an event can not be changed'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
+        error_list = validation_errors(data)
+        has_tags = 0
+        tags_list = list()
+        if error_list[0] == 1:
+            return error_list[1]
+        elif error_list[0] == 2:
+            category_list = error_list[1]
+        else:
+            category_list = error_list[1]
+            tags_list = error_list[2]
+            has_tags = 1
+
+        if isinstance(event, SoloEvent):
+            solo_event = event
             # Shifting to team event
             if data['team_event']:
                 if 'min_team_size' in data and 'max_team_size' in data:
@@ -368,20 +418,20 @@ class EventDetailEditDeleteView(APIView):
                         return Response({'error': 'Team event with such title already exists.'},
                                         status=status.HTTP_422_UNPROCESSABLE_ENTITY)
                     except TeamEvent.DoesNotExist:
-                        team_event = TeamEvent(event_picture=data['event_picture'], event_logo=data['event_logo'],
-                                               title=data['title'], description=data['description'],
-                                               start_time=data['start_time'], start_date=data['start_date'],
-                                               end_date=data['end_date'], end_time=data['end_time'],
-                                               venue=data['venue'], team_event=data['team_event'],
-                                               min_team_size=data['min_team_size'], max_team_size=data['max_team_size'],
-                                               max_participants=data['max_participants'], public_id=public_id,
-                                               reserved_slots=data['reserved_slots'])
-                        solo_event.delete()
-                        team_event.save()
-                        team_event.category.set(category_list)
-                        if has_tags == 1:
+                        # the event is converted in place, keeping its public_id
+                        with transaction.atomic():
+                            try:
+                                team_event = solo_event.convert_to(TeamEvent, min_team_size=data['min_team_size'],
+                                                                   max_team_size=data['max_team_size'])
+                            except EventHasRegistrations as error:
+                                return Response({'error': 'A solo event with registrations can not become '
+                                                          'a team event, cancel these registrations first.',
+                                                 'registrations': error.registrations},
+                                                status=status.HTTP_409_CONFLICT)
+                            set_event_fields(team_event, data)
+                            team_event.save()
+                            team_event.category.set(category_list)
                             team_event.tags.set(tags_list)
-                        team_event.save()
                         team_event_serializer = TeamEventSerializer(team_event)
                         return Response(team_event_serializer.data, status=status.HTTP_202_ACCEPTED)
                 else:
@@ -395,80 +445,72 @@ class EventDetailEditDeleteView(APIView):
                     if has_tags == 1:
                         solo_event.tags.set(tags_list)
                     else:  # removing previous tags
-                        for tag in solo_event.tags.all():
-                            solo_event.tags.remove(tag)
+                        solo_event.tags.clear()
                     solo_event.save()
                     return Response(solo_event_serializer.data, status=status.HTTP_202_ACCEPTED)
                 return Response(solo_event_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        except SoloEvent.DoesNotExist:
-            try:
-                team_event = TeamEvent.objects.get(public_id=public_id)
-                data = JSONParser().parse(request)
-                if 'public_id' in data:
-                    if public_id != data['public_id']:
-                        return Response({'error': 'public_id of an event can not be changed'},
-                                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-
-                error_list = validation_errors(data)
-                has_tags = 0
-                tags_list = list()
-                if error_list[0] == 1:
-                    return error_list[1]
-                elif error_list[0] == 2:
-                    category_list = error_list[1]
-                else:
-                    category_list = error_list[1]
-                    tags_list = error_list[2]
-                    has_tags = 1
-
-                # Shifting to solo event
-                if not data['team_event']:
-                    try:  # if title is changed
-                        SoloEvent.objects.get(title=data['title'])
-                        return Response({'error': 'Solo event with such title already exists.'},
-                                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-                    except SoloEvent.DoesNotExist:
-                        solo_event = SoloEvent(event_picture=data['event_picture'], event_logo=data['event_logo'],
-                                               title=data['title'], description=data['description'],
-                                               start_time=data['start_time'], start_date=data['start_date'],
-                                               end_date=data['end_date'], end_time=data['end_time'],
-                                               venue=data['venue'], team_event=data['team_event'],
-                                               max_participants=data['max_participants'], public_id=public_id,
-                                               reserved_slots=data['reserved_slots'])
-                        team_event.delete()
+        else:
+            team_event = event
+            # Shifting to solo event
+            if not data['team_event']:
+                try:  # if title is changed
+                    SoloEvent.objects.get(title=data['title'])
+                    return Response({'error': 'Solo event with such title already exists.'},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                except SoloEvent.DoesNotExist:
+                    # the event is converted in place, keeping its public_id
+                    with transaction.atomic():
+                        try:
+                            solo_event = team_event.convert_to(SoloEvent)
+                        except EventHasRegistrations as error:
+                            return Response({'error': 'A team event with registrations can not become a solo event, '
+                                                      'cancel these registrations first.',
+                                             'registrations': error.registrations},
+                                            status=status.HTTP_409_CONFLICT)
+                        set_event_fields(solo_event, data)
                         solo_event.save()
                         solo_event.category.set(category_list)
-                        if has_tags == 1:
-                            solo_event.tags.set(tags_list)
-                        solo_event.save()
-                        solo_event_serializer = SoloEventSerializer(solo_event)
-                        return Response(solo_event_serializer.data, status=status.HTTP_202_ACCEPTED)
-                else:
-                    team_event_serializer = TeamEventSerializer(team_event, data=data)
-                    if team_event_serializer.is_valid():
-                        team_event_serializer.save()
-                        team_event.category.set(category_list)
-                        if has_tags == 1:
-                            team_event.tags.set(tags_list)
-                        else:  # removing previous tags
-                            for tag in team_event.tags.set():
-                                team_event.tags.remove(tag)
-                        team_event.save()
-                        return Response(team_event_serializer.data, status=status.HTTP_202_ACCEPTED)
-                    return Response(team_event_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            except TeamEvent.DoesNotExist:
-                return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                        solo_event.tags.set(tags_list)
+                    solo_event_serializer = SoloEventSerializer(solo_event)
+                    return Response(solo_event_serializer.data, status=status.HTTP_202_ACCEPTED)
+            else:
+                team_event_serializer = TeamEventSerializer(team_event, data=data)
+                if team_event_serializer.is_valid():
+                    team_event_serializer.save()
+                    team_event.category.set(category_list)
+                    if has_tags == 1:
+                        team_event.tags.set(tags_list)
+                    else:  # removing previous tags
+                        team_event.tags.clear()
+                    team_event.save()
+                    return Response(team_event_serializer.data, status=status.HTTP_202_ACCEPTED)
+                return Response(team_event_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, public_id, format=None):
-        try:
-            solo_event = SoloEvent.objects.get(public_id=public_id)
-            solo_event.delete()
-        except SoloEvent.DoesNotExist:
-            try:
-                team_event = TeamEvent.objects.get(public_id=public_id)
-                team_event.delete()
-            except TeamEvent.DoesNotExist:
-                return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-            return Response(status=status.HTTP_200_OK)
+        event = event_resolver.resolve(public_id)
+        if event is None:
+            return Response({'error': 'This event does not exist'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        event.delete()
         return Response(status=status.HTTP_200_OK)
+
+
+class EventStatsView(APIView):
+    """
+        Seats filled, reserved seats used and waiting list length of every event, for the organizers dashboard.
+        Read from the seat counters of the events with a single query and cached until a registration changes
+    """
+    permission_classes = (IsAuthenticated, )
+    fields = ('public_id', 'title', 'max_participants', 'reserved_slots', 'participants_count',
+              'reserved_participants_count', 'waiting_participants_count')
+
+    def get(self, request, format=None):
+        if not request.user.is_staff:
+            return Response({'error': 'You do not have permission to perform this action'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        return Response({'events': cached_event_stats(self.event_stats)}, status=status.HTTP_200_OK)
+
+    def event_stats(self):
+        return list(Event.objects.order_by('start_date', 'start_time', 'pk').values(*self.fields))
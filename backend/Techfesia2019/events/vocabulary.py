@@ -0,0 +1,84 @@
+import threading
+
+from django.db import transaction
+
+from events.models import Category, Tags
+from events.utils import get_cache_version, vocabulary_version_key
+
+DEFAULT_CATEGORY = 'Others'
+DEFAULT_CATEGORY_DESCRIPTION = 'It is a default category for events'
+
+
+class Vocabulary:
+    """
+        In-process name -> id cache of a taxonomy model (Category or Tags).
+        The whole vocabulary is loaded in one query and reloaded only when its version in the shared cache changes,
+        which happens on every committed save or delete of the model, so other processes see the changes too.
+        Names read inside a transaction are remembered only once it commits, rows it created may be rolled back.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = vocabulary_version_key(model)
+        self._ids = dict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _remember(self, version, ids, reloaded):
+        with self._lock:
+            if reloaded:
+                self._ids = ids
+                self._version = version
+            elif self._version == version:
+                self._ids.update(ids)
+
+    def _current_ids(self):
+        version = get_cache_version(self.version_key)
+        with self._lock:
+            if self._version == version:
+                return version, self._ids
+
+        ids = dict(self.model.objects.values_list('name', 'id'))
+        # runs at once outside of transactions
+        transaction.on_commit(lambda: self._remember(version, ids, reloaded=True))
+        return version, ids
+
+    def resolve(self, names):
+        """
+            Returns a dict of name -> id for the given names and the list of names that do not exist.
+            Names missing from the cached vocabulary are looked up with a single name__in query
+            in case they were created after it was loaded.
+        """
+        version, ids = self._current_ids()
+        missing = [name for name in names if name not in ids]
+        if missing:
+            found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+            transaction.on_commit(lambda: self._remember(version, found, reloaded=False))
+            ids = {**ids, **found}
+
+        return {name: ids[name] for name in names if name in ids}, [name for name in names if name not in ids]
+
+    def clear(self):
+        """
+            Forgets the loaded names, the next resolve reloads them
+        """
+        with self._lock:
+            self._ids = dict()
+            self._version = None
+
+
+categories = Vocabulary(Category)
+tags = Vocabulary(Tags)
+
+
+def default_category_id():
+    """
+        Returns the id of the default category, creating it if it does not exist yet
+    """
+    ids, _ = categories.resolve([DEFAULT_CATEGORY])
+    if DEFAULT_CATEGORY in ids:
+        return ids[DEFAULT_CATEGORY]
+
+    category, _ = Category.objects.get_or_create(name=DEFAULT_CATEGORY,
+                                                 defaults={'description': DEFAULT_CATEGORY_DESCRIPTION})
+    return category.id
@@ -0,0 +1,141 @@
+"""
+    Local verification of Firebase ID tokens.
+
+    ID tokens are JWTs signed by Google with RS256. Their signature is checked against the public certificates
+    published by Google, which are cached for the max-age of their Cache-Control header. The certificates are
+    refreshed in the background shortly before they expire, so a login only waits for Google when the cache
+    is empty or expired, or when a token is signed by a key that is not cached yet.
+"""
+import base64
+import binascii
+import json
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from google.auth import jwt
+
+from base.decorators import run_in_background
+
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+
+def max_age(cache_control, default):
+    match = MAX_AGE_PATTERN.search(cache_control or '')
+    return int(match.group(1)) if match else default
+
+
+def unverified_header(token):
+    """
+        Returns the header of a JWT without checking anything. Raises ValueError if it can not be read
+    """
+    try:
+        header = token.split('.')[0]
+        header = json.loads(base64.urlsafe_b64decode(header + '=' * (-len(header) % 4)))
+    except (TypeError, AttributeError, UnicodeError, json.JSONDecodeError, binascii.Error):
+        raise ValueError("Malformed token")
+    # valid JSON is not necessarily an object, like 1, null or []
+    if not isinstance(header, dict):
+        raise ValueError("Malformed token")
+    return header
+
+
+class FirebaseKeyStore:
+    """
+        Public certificates of the signing keys of Firebase ID tokens, kid -> PEM, cached for the
+        max-age announced by Google and refreshed in the background settings.FIREBASE_KEYS_REFRESH_MARGIN
+        seconds before they expire
+    """
+
+    def __init__(self):
+        self._certificates = dict()
+        self._expires_at = 0
+        self._unknown_key_refreshed_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def fetch(self):
+        """
+            Downloads the certificates, returns them with the number of seconds they may be cached for
+        """
+        response = requests.get(settings.FIREBASE_PUBLIC_KEYS_URL, timeout=10)
+        response.raise_for_status()
+        seconds = max_age(response.headers.get('Cache-Control'), settings.FIREBASE_KEYS_DEFAULT_MAX_AGE)
+        return response.json(), seconds
+
+    def refresh(self):
+        try:
+            certificates, seconds = self.fetch()
+            with self._lock:
+                self._certificates = certificates
+                self._expires_at = time.monotonic() + seconds
+        finally:
+            self._refreshing = False
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # the next token tries again
+            pass
+
+    def certificates(self, kid):
+        """
+            Returns the cached certificates, which should contain the one of kid
+        """
+        now = time.monotonic()
+        if now >= self._expires_at:
+            self.refresh()
+        elif kid not in self._certificates:
+            # keys are rotated before Google announces them, but tokens of unknown keys must not
+            # make every login download the certificates
+            if self._unknown_key_refreshed_at is None or \
+                    now - self._unknown_key_refreshed_at >= settings.FIREBASE_KEYS_REFRESH_MARGIN:
+                self._unknown_key_refreshed_at = now
+                self.refresh()
+        elif now >= self._expires_at - settings.FIREBASE_KEYS_REFRESH_MARGIN and not self._refreshing:
+            self._refreshing = True
+            run_in_background(self._refresh_quietly)()
+
+        return self._certificates
+
+    def clear(self):
+        with self._lock:
+            self._certificates = dict()
+            self._expires_at = 0
+            self._unknown_key_refreshed_at = None
+            self._refreshing = False
+
+
+firebase_key_store = FirebaseKeyStore()
+
+
+def verify_firebase_token(id_token):
+    """
+        Returns the claims of a Firebase ID token issued for settings.FIREBASE_PROJECT_ID.
+        The uid of the user is the sub claim. Raises ValueError if the token is not valid
+    """
+    header = unverified_header(id_token)
+    if header.get('alg') != 'RS256':
+        raise ValueError("Firebase ID tokens are signed with RS256")
+
+    certificates = firebase_key_store.certificates(header.get('kid'))
+    # checks the signature, the audience and the expiry
+    claims = jwt.decode(id_token, certs=certificates, audience=settings.FIREBASE_PROJECT_ID)
+    if not isinstance(claims, dict):
+        raise ValueError("Malformed token")
+
+    if claims.get('iss') != f'https://securetoken.google.com/{settings.FIREBASE_PROJECT_ID}':
+        raise ValueError("Token has an invalid issuer")
+    if not isinstance(claims.get('sub'), str) or not 0 < len(claims['sub']) <= 128:
+        raise ValueError("Token has an invalid subject")
+    auth_time = claims.get('auth_time')
+    # bool is a subclass of int
+    if not isinstance(auth_time, (int, float)) or isinstance(auth_time, bool):
+        raise ValueError("Token has an invalid authentication time")
+    if auth_time > time.time() + 60:
+        raise ValueError("Token has an authentication time in the future")
+
+    return claims
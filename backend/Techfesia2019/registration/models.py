@@ -4,6 +4,7 @@ from django.db import models
 # Create your models here.
 from django.db.models import signals
 from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
 
 
 class User(AbstractUser):
@@ -12,8 +13,16 @@ class User(AbstractUser):
     List of inherited fields: first_name, last_name, email, username, password
     """
 
+    email = models.EmailField(_('email address'), blank=True, db_index=True)
+
     email_confirmed = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # logins find users by email, users without email are allowed
+            models.UniqueConstraint(fields=['email'], condition=~models.Q(email=''), name='unique_user_email'),
+        ]
+
 
 class FirebaseUser(models.Model):
     """
@@ -1,3 +1,4 @@
+import requests
 from django.shortcuts import get_object_or_404
 from firebase_admin import auth
 from rest_framework import serializers
@@ -9,7 +10,18 @@ from django.utils.six import text_type
 
 
 from registration.models import User, FirebaseUser
-from registration.utils import FirebaseUtils
+from registration.firebase_tokens import verify_firebase_token
+from registration.utils import FirebaseAccount, FirebaseUtils
+
+
+def find_user(email, context):
+    """
+        Returns the user having email, with its firebase account, None if there is none.
+        Views that already fetched the user pass it as context['user'] along with context['email']
+    """
+    if 'user' in context and context.get('email') == email:
+        return context['user']
+    return User.objects.select_related('firebaseuser').filter(email=email).first()
 
 
 class FirebaseUserSerializer(serializers.Serializer):
@@ -21,16 +33,19 @@ class FirebaseUserSerializer(serializers.Serializer):
     email = serializers.EmailField()
     uid = serializers.CharField(max_length=100)
 
+    def get_firebase_user(self, data):
+        return FirebaseUtils.check_firebase_credentials(email=data['email'], uid=data['uid'])
+
     def validate(self, data):
         # print("Hello")
         try:
-            user_from_firebase = FirebaseUtils.check_firebase_credentials(email=data['email'], uid=data['uid'])
+            user_from_firebase = self.get_firebase_user(data)
             data['firebase_user'] = user_from_firebase
         except serializers.ValidationError:
             # remap all validation errors to auth failed error
             raise rest_exceptions.AuthenticationFailed()
 
-        user = User.objects.filter(email=data['email']).first()
+        user = find_user(data['email'], self.context)
         if user:
             # User exists, Go to next step
             data['user'] = user
@@ -85,6 +100,31 @@ class FirebaseUserSerializer(serializers.Serializer):
         return self.create_or_update_firebase_account(validated_data)
 
 
+class FirebaseIdTokenSerializer(FirebaseUserSerializer):
+    """
+        Same as FirebaseUserSerializer, but takes a firebase ID token instead of email and uid.
+        The token is verified locally, without asking firebase about the user
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(FirebaseIdTokenSerializer, self).__init__(*args, **kwargs)
+
+        del self.fields['email']
+        del self.fields['uid']
+        self.fields['id_token'] = serializers.CharField()
+
+    def get_firebase_user(self, data):
+        try:
+            claims = verify_firebase_token(data['id_token'])
+        except (ValueError, requests.RequestException):
+            raise serializers.ValidationError("Invalid firebase ID token")
+        if not claims.get('email') or not claims.get('email_verified', False):
+            raise serializers.ValidationError("The firebase account has no verified email")
+
+        data['email'] = claims['email']
+        return FirebaseAccount(claims['sub'], claims['email'], claims.get('name'), claims.get('picture'))
+
+
 class FirebaseTokenObtainSerializer(serializers.Serializer):
 
     email_field = User.EMAIL_FIELD
@@ -101,7 +141,7 @@ class FirebaseTokenObtainSerializer(serializers.Serializer):
         uid = attrs['uid']
 
         try:
-            user = User.objects.filter(email=email).first()
+            user = find_user(email, self.context)
 
             if user and hasattr(user, 'firebaseuser'):
                 if user.firebaseuser.uid == uid:
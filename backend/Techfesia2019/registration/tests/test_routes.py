@@ -0,0 +1,181 @@
+import base64
+import json
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from google.auth import crypt, jwt
+from rest_framework.test import APITestCase
+
+from registration.firebase_tokens import firebase_key_store
+from registration.models import FirebaseUser, User
+from registration.utils import firebase_user_cache, get_firebase_backend
+
+
+def generate_keypair():
+    """
+        Returns the PEMs of a new RSA private key and its public key, made by cryptography if installed,
+        else by rsa, one of which google-auth verifies signatures with
+    """
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        import rsa
+        public_key, private_key = rsa.newkeys(1024)
+        return private_key.save_pkcs1().decode(), public_key.save_pkcs1().decode()
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                            serialization.NoEncryption())
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private_pem.decode(), public_pem.decode()
+
+
+def base64url(value):
+    return base64.urlsafe_b64encode(value).rstrip(b'=').decode()
+
+
+class LocalTokenIssuer:
+    """
+        Issues firebase-like ID tokens signed by a key generated for the tests
+    """
+
+    def __init__(self, kid='test-key'):
+        private_pem, self.certificate = generate_keypair()
+        self.kid = kid
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+
+    def certificates(self):
+        return {self.kid: self.certificate}
+
+    def token(self, uid, email, **claims):
+        now = int(time.time())
+        payload = dict(iss=f'https://securetoken.google.com/{settings.FIREBASE_PROJECT_ID}',
+                       aud=settings.FIREBASE_PROJECT_ID, sub=uid, email=email, email_verified=True,
+                       auth_time=now, iat=now, exp=now + 3600)
+        payload.update(claims)
+        return jwt.encode(self.signer, payload).decode()
+
+
+@override_settings(FIREBASE_KEYS_REFRESH_MARGIN=60)
+class FirebaseIdTokenTestCase(APITestCase):
+    """
+        Firebase ID tokens are verified locally against cached signing keys
+    """
+
+    def setUp(self):
+        firebase_key_store.clear()
+        self.issuer = LocalTokenIssuer()
+        patcher = mock.patch.object(firebase_key_store, 'fetch', side_effect=self.fetch)
+        self.fetch_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self):
+        return self.issuer.certificates(), 3600
+
+    def login(self, token):
+        return self.client.post(reverse('registration:firebase_auth'), {'id_token': token})
+
+    def test_login_creates_user_and_returns_tokens(self):
+        for _ in range(2):
+            response = self.login(self.issuer.token('uid-1', 'user@example.com'))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('access', response.data)
+
+        self.assertEqual(FirebaseUser.objects.get(uid='uid-1').user.email, 'user@example.com')
+        self.assertEqual(User.objects.count(), 1)
+        # the keys were downloaded once
+        self.assertEqual(self.fetch_mock.call_count, 1)
+
+    def test_invalid_tokens_are_rejected(self):
+        other_issuer = LocalTokenIssuer()
+        tokens = [
+            other_issuer.token('uid-1', 'user@example.com'),
+            self.issuer.token('uid-1', 'user@example.com', aud='other-project'),
+            self.issuer.token('uid-1', 'user@example.com', iss='https://example.com'),
+            self.issuer.token('uid-1', 'user@example.com', exp=int(time.time()) - 3600),
+            self.issuer.token('uid-1', 'user@example.com', auth_time='yesterday'),
+            self.issuer.token('uid-1', 'user@example.com', auth_time=None),
+            self.issuer.token('uid-1', 'user@example.com', auth_time=int(time.time()) + 3600),
+            'not a token',
+        ]
+        for token in tokens:
+            self.assertEqual(self.login(token).status_code, 401)
+        self.assertFalse(User.objects.exists())
+
+    def test_tokens_that_are_not_json_objects_are_rejected(self):
+        # headers of 1, null and []
+        for token in ('MQ.eA.eA', 'bnVsbA.eA.eA', 'W10.eA.eA'):
+            self.assertEqual(self.login(token).status_code, 401, token)
+
+        # correctly signed payloads of 1, null and []
+        header = self.issuer.token('uid-1', 'user@example.com').split('.')[0]
+        for payload in (1, None, []):
+            signed_section = f'{header}.{base64url(json.dumps(payload).encode())}'
+            token = f'{signed_section}.{base64url(self.issuer.signer.sign(signed_section))}'
+            self.assertEqual(self.login(token).status_code, 401, payload)
+        self.assertFalse(User.objects.exists())
+
+    def test_email_must_be_verified(self):
+        self.assertEqual(self.login(self.issuer.token('uid-1', 'user@example.com', email_verified=False)).status_code,
+                         401)
+        token = self.issuer.token('uid-1', 'user@example.com')
+        claims = jwt.decode(token, verify=False)
+        del claims['email_verified']
+        self.assertEqual(self.login(jwt.encode(self.issuer.signer, claims).decode()).status_code, 401)
+        self.assertFalse(User.objects.exists())
+
+    def test_keys_are_refreshed_in_the_background_before_they_expire(self):
+        self.login(self.issuer.token('uid-1', 'user@example.com'))
+        firebase_key_store._expires_at = time.monotonic() + 30
+
+        with mock.patch('registration.firebase_tokens.run_in_background') as run_in_background:
+            self.assertEqual(self.login(self.issuer.token('uid-1', 'user@example.com')).status_code, 200)
+        run_in_background.assert_called_once_with(firebase_key_store._refresh_quietly)
+
+    def test_rotated_key_is_fetched_once(self):
+        self.login(self.issuer.token('uid-1', 'user@example.com'))
+        self.issuer = LocalTokenIssuer(kid='rotated-key')
+
+        self.assertEqual(self.login(self.issuer.token('uid-1', 'user@example.com')).status_code, 200)
+        self.assertEqual(self.fetch_mock.call_count, 2)
+
+
+@override_settings(FIREBASE_BACKEND='registration.utils.FakeFirebaseBackend')
+class FirebaseLoginTestCase(APITestCase):
+    """
+        A returning user is read with a single query through the indexed email
+    """
+
+    def setUp(self):
+        firebase_user_cache.clear()
+        get_firebase_backend().add_user('uid-1', 'user@example.com')
+
+    def login(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('registration:firebase_auth'),
+                                        {'email': 'user@example.com', 'uid': 'uid-1'})
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_returning_user_is_read_once(self):
+        self.login()
+        self.assertEqual(FirebaseUser.objects.get(uid='uid-1').user.email, 'user@example.com')
+
+        queries = self.login()
+        # the user with its firebase account, then the refresh token recorded by the blacklist app
+        self.assertEqual(len(queries), 2)
+        self.assertIn('registration_firebaseuser', queries[0])
+
+    def test_emails_are_unique(self):
+        User.objects.create(username='first', email='user@example.com')
+        User.objects.create(username='second')
+        User.objects.create(username='third')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create(username='fourth', email='user@example.com')
@@ -0,0 +1,49 @@
+from django.test import TestCase, override_settings
+from rest_framework import exceptions as rest_exceptions
+
+from registration.models import FirebaseUser, User
+from registration.serializers import FirebaseTokenObtainSerializer, FirebaseUserSerializer
+from registration.utils import firebase_user_cache, get_firebase_backend
+
+
+@override_settings(FIREBASE_BACKEND='registration.utils.FakeFirebaseBackend')
+class FirebaseUserCacheTestCase(TestCase):
+    """
+        Firebase users are read once per cache timeout, unknown uids too
+    """
+
+    def setUp(self):
+        firebase_user_cache.clear()
+        self.firebase = get_firebase_backend()
+        self.firebase.users.clear()
+        self.firebase.requests = 0
+        self.firebase.add_user('uid-1', 'user@example.com', photo_url='https://example.com/user.png')
+
+    def test_first_logins_are_cached(self):
+        for _ in range(3):
+            serializer = FirebaseUserSerializer(data={'email': 'user@example.com', 'uid': 'uid-1'})
+            self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        self.assertEqual(FirebaseUser.objects.get(uid='uid-1').profile_pic_url, 'https://example.com/user.png')
+        self.assertEqual(self.firebase.requests, 1)
+        self.assertEqual(firebase_user_cache.metrics, dict(hits=2, negative_hits=0, misses=1))
+
+    def test_uid_changes_are_checked_against_the_cache(self):
+        user = User.objects.create(username='user', email='user@example.com')
+        FirebaseUser.objects.create(user=user, uid='old-uid')
+        firebase_user_cache.get('uid-1')
+
+        serializer = FirebaseTokenObtainSerializer(data={'email': 'user@example.com', 'uid': 'uid-1'})
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(FirebaseUser.objects.get(user=user).uid, 'uid-1')
+        self.assertEqual(self.firebase.requests, 1)
+
+    def test_unknown_uids_are_cached(self):
+        for _ in range(3):
+            serializer = FirebaseUserSerializer(data={'email': 'user@example.com', 'uid': 'unknown'})
+            with self.assertRaises(rest_exceptions.AuthenticationFailed):
+                serializer.is_valid()
+
+        self.assertEqual(self.firebase.requests, 1)
+        self.assertEqual(firebase_user_cache.metrics, dict(hits=0, negative_hits=2, misses=1))
@@ -1,6 +1,114 @@
+import threading
+from collections import namedtuple
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils.module_loading import import_string
 from firebase_admin import auth
 from rest_framework import serializers
 
+# the details of a firebase user needed for logins
+FirebaseAccount = namedtuple('FirebaseAccount', ('uid', 'email', 'display_name', 'photo_url'))
+
+# raised by firebase_admin for unknown uids, AuthError up to firebase-admin 2.x
+USER_NOT_FOUND_ERRORS = tuple(getattr(auth, name) for name in ('UserNotFoundError', 'AuthError') if hasattr(auth, name))
+
+
+class FirebaseAdminBackend:
+    """
+        Reads firebase users with firebase_admin, over the network
+    """
+
+    def get_user(self, uid):
+        """
+            Returns the FirebaseAccount of uid, None if firebase has no such user
+        """
+        try:
+            user = auth.get_user(uid)
+        except USER_NOT_FOUND_ERRORS:
+            return None
+        return FirebaseAccount(user.uid, user.email, user.display_name, user.photo_url)
+
+
+class FakeFirebaseBackend:
+    """
+        In-memory firebase users for tests and local development, select it with
+        FIREBASE_BACKEND = 'registration.utils.FakeFirebaseBackend'
+    """
+
+    def __init__(self):
+        self.users = dict()
+        self.requests = 0
+
+    def add_user(self, uid, email, display_name=None, photo_url=None):
+        self.users[uid] = FirebaseAccount(uid, email, display_name, photo_url)
+
+    def get_user(self, uid):
+        self.requests += 1
+        return self.users.get(uid)
+
+
+_backends = dict()
+
+
+def get_firebase_backend():
+    """
+        Returns the instance of the backend configured by settings.FIREBASE_BACKEND, shared by the process
+    """
+    path = settings.FIREBASE_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+class FirebaseUserCache:
+    """
+        Bounded TTL cache of uid -> FirebaseAccount in front of the firebase backend.
+        Unknown uids are cached too, for a shorter time, so that repeated bad logins do not reach firebase either.
+        Hits and misses are counted in metrics
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl):
+        self._accounts = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._unknown = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        # cachetools caches are not thread safe
+        self._lock = threading.Lock()
+        self.metrics = dict(hits=0, negative_hits=0, misses=0)
+
+    def get(self, uid):
+        """
+            Returns the FirebaseAccount of uid, None if firebase has no such user.
+            Errors of the backend are raised and not cached
+        """
+        with self._lock:
+            account = self._accounts.get(uid)
+            if account is not None:
+                self.metrics['hits'] += 1
+                return account
+            if uid in self._unknown:
+                self.metrics['negative_hits'] += 1
+                return None
+            self.metrics['misses'] += 1
+
+        account = get_firebase_backend().get_user(uid)
+        with self._lock:
+            if account is None:
+                self._unknown[uid] = True
+            else:
+                self._accounts[uid] = account
+        return account
+
+    def clear(self):
+        with self._lock:
+            self._accounts.clear()
+            self._unknown.clear()
+            self.metrics = dict(hits=0, negative_hits=0, misses=0)
+
+
+firebase_user_cache = FirebaseUserCache(maxsize=settings.FIREBASE_USER_CACHE_SIZE,
+                                        ttl=settings.FIREBASE_USER_CACHE_TIMEOUT,
+                                        negative_ttl=settings.FIREBASE_UNKNOWN_USER_CACHE_TIMEOUT)
+
 
 class FirebaseUtils:
 
@@ -8,18 +116,19 @@ class FirebaseUtils:
     def check_firebase_credentials(email, uid):
         """
         Checks whether the email matches with the email of firebase user.
-        If true, returns firebase user object. Else raises appropriate exceptions
+        If true, returns the FirebaseAccount of the user. Else raises appropriate exceptions
         """
         try:
-            user_from_firebase = auth.get_user(uid)
-            if user_from_firebase.email != email:
-                # incorrect email provided
-                raise serializers.ValidationError("uid mismatch")
+            user_from_firebase = firebase_user_cache.get(uid)
+        except Exception:
+            print("ERROR: UNABLE TO CONNECT TO FIREBASE")
+            raise serializers.ValidationError("Unable to connect to firebase")
 
-            return user_from_firebase
-        except auth.AuthError:
+        if user_from_firebase is None:
             # UID does not exist
             raise serializers.ValidationError("Invalid uid or No user found with the given uid")
-        except:
-            print("ERROR: UNABLE TO CONNECT TO FIREBASE")
-            raise serializers.ValidationError("Unable to connect to firebase")
\ No newline at end of file
+        if user_from_firebase.email != email:
+            # incorrect email provided
+            raise serializers.ValidationError("uid mismatch")
+
+        return user_from_firebase
@@ -38,24 +38,36 @@ class FirebaseAuthenticationView(APIView):
     Verifies from firebase.
     If user does not exist, creates user.
     Finally provides token
+
+    Alternatively takes id_token, a firebase ID token verified locally
     """
 
     def post(self, request):
+        if 'id_token' in request.data:
+            sr = serializers.FirebaseIdTokenSerializer(data=request.data)
+            if not sr.is_valid():
+                raise rest_exceptions.AuthenticationFailed()
+            firebase_user = sr.save()
+            tokens = serializers.FirebaseTokenObtainPairSerializer.get_token_object(firebase_user.user)
+            return Response(status=status.HTTP_200_OK, data=tokens)
+
         email = request.data.get('email')
         uid = request.data.get('uid')
-        user_obj = User.objects.filter(email=email).first()
+        # fetched once with its firebase account, both serializers use it
+        user_obj = User.objects.select_related('firebaseuser').filter(email=email).first()
 
         if not (user_obj and hasattr(user_obj,"firebaseuser")):
-            sr = serializers.FirebaseUserSerializer(data=request.data)
+            sr = serializers.FirebaseUserSerializer(data=request.data, context={'email': email, 'user': user_obj})
             if sr.is_valid():
                 firebase_user = sr.save()
                 user_obj = firebase_user.user
 
-        firebase_token_pair_serializer =  serializers.FirebaseTokenObtainPairSerializer(data=request.data)
+        firebase_token_pair_serializer =  serializers.FirebaseTokenObtainPairSerializer(
+            data=request.data, context={'email': email, 'user': user_obj})
 
         if firebase_token_pair_serializer.is_valid():
-            tokens = serializers.FirebaseTokenObtainPairSerializer.get_token_object(user_obj)
-            return Response(status=status.HTTP_200_OK, data=tokens)
+            # the serializer has made the tokens of the user
+            return Response(status=status.HTTP_200_OK, data=firebase_token_pair_serializer.validated_data)
         else:
             raise rest_exceptions.AuthenticationFailed()
 
@@ -3444,7 +3444,7 @@ const postmanData = {
 								"{{event_id}}"
 							]
 						},
-						"description": "Allow editing of event details. Can edit everything except Id.\n\nIf editing teamEvent field from false to true then must provide maxSize, minSize fields."
+						"description": "Allow editing of event details. Can edit everything except Id.\n\nIf editing teamEvent field from false to true then must provide maxSize, minSize fields.\n\nChanging teamEvent keeps the id of the event. Registrations are not converted, so events with registrations or pending admission tickets respond with 409 Conflict:\n\n{\n\t\"error\": \"A solo event with registrations can not become a team event, cancel these registrations first.\",\n\t\"registrations\": [\"public ids of the blocking registrations and tickets\"]\n}"
 					},
 					"response": [
 						{